@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+import config
+from conversation_memory import estimate_tokens
+
+# --- ADAPTIVE TOP-K ---
+# Instead of a fixed LIMIT per strategy, retrieval over-fetches a candidate pool and
+# decides here how many chunks reach the prompt:
+#   1. per strategy, cut where scores fall below a floor or drop sharply (relevance gap)
+#   2. keep the remaining chunks in retrieval order, up to max_k and within a token budget
+# Precise questions end up with a couple of chunks, broad ones with up to max_k.
+
+@dataclass
+class Selection:
+    candidates: int = 0
+    k: int = 0
+    tokens: int = 0
+    reason: str = ""        # Why the list ends: gap | threshold | budget | max_k | pool_exhausted
+    semantic_cut: str = ""  # Per-strategy cut (gap | threshold | pool_exhausted), for tuning
+    keyword_cut: str = ""
+
+
+def cut_ranked(chunks, min_score=None, gap_ratio=None):
+    """
+    Cuts one strategy's results (best score first) at the first score below 'min_score'
+    or the first drop larger than 'gap_ratio' of the previous score. The top hit is
+    always kept. Returns (kept, reason).
+    """
+    min_score = config.ADAPTIVE_MIN_SCORE if min_score is None else min_score
+    gap_ratio = config.ADAPTIVE_GAP_RATIO if gap_ratio is None else gap_ratio
+    for i in range(1, len(chunks)):
+        previous, score = chunks[i - 1].score, chunks[i].score
+        if score < min_score:
+            return chunks[:i], "threshold"
+        if previous > 0 and previous - score > gap_ratio * previous:
+            return chunks[:i], "gap"
+    return chunks, "pool_exhausted"
+
+
+def fit_budget(chunks, max_k=None, token_budget=None):
+    """
+    Keeps chunks in order until 'max_k' or the token budget is reached (at least one).
+    Returns (kept, tokens, reason) where reason is "" if everything fit.
+    """
+    max_k = max_k or config.ADAPTIVE_MAX_K
+    token_budget = token_budget or config.CONTEXT_TOKEN_BUDGET
+    kept, used = [], 0
+    for chunk in chunks:
+        if len(kept) >= max_k:
+            return kept, used, "max_k"
+        cost = estimate_tokens(chunk.text)
+        if kept and used + cost > token_budget:
+            return kept, used, "budget"
+        kept.append(chunk)
+        used += cost
+    return kept, used, ""
+
+
+def select(chunks, cut=True, min_k=None):
+    """
+    Chooses the prompt's chunks from 'chunks' (merged/fused candidates, best first).
+    With cut=False (e.g. after reranking, whose order retrieval scores don't explain)
+    only max_k and the token budget apply. Returns (selected, Selection).
+    """
+    min_k = config.ADAPTIVE_MIN_K if min_k is None else min_k
+    selection = Selection(candidates=len(chunks))
+
+    ordered = chunks
+    if cut:
+        keep = set()
+        for source in ("semantic", "keyword"):
+            ranked = sorted((c for c in chunks if c.source == source), key=lambda c: c.score, reverse=True)
+            if not ranked:
+                continue
+            kept, reason = cut_ranked(ranked)
+            setattr(selection, f"{source}_cut", reason)
+            keep.update(c.key for c in kept)
+        ordered = [c for c in chunks if c.key in keep]
+        # Never starve the prompt: top up with the next candidates in retrieval order
+        for chunk in chunks:
+            if len(ordered) >= min_k:
+                break
+            if chunk.key not in keep:
+                ordered.append(chunk)
+
+    selected, selection.tokens, budget_reason = fit_budget(ordered)
+    selection.k = len(selected)
+    cuts = (selection.semantic_cut, selection.keyword_cut)
+    if budget_reason:
+        selection.reason = budget_reason
+    elif "gap" in cuts:
+        selection.reason = "gap"
+    elif "threshold" in cuts:
+        selection.reason = "threshold"
+    else:
+        selection.reason = "pool_exhausted"
+    return selected, selection
@@ -1,16 +1,24 @@
 import streamlit as st
 import os
-import shutil
-import time
-import psycopg2
-import zipfile
-from git import Repo
+import uuid
 import config
+import jobs
+import chat_store
+import chat_session
+import telemetry
 
 # Page Config: Centered layout looks more like a "Landing Page"
 st.set_page_config(page_title="Codebase RAG", page_icon="🚀", layout="centered")
 
-WATCH_DIR = config.WATCH_DIR
+telemetry.start_metrics_server()
+
+@st.cache_resource
+def init_job_queue():
+    # Once per process, not on every rerun
+    jobs.ensure_schema()
+    chat_store.ensure_schema()
+
+init_job_queue()
 
 # --- HERO SECTION ---
 import styles
@@ -43,35 +51,59 @@ def normalize_github_url(url):
         return "/".join(parts[:5])
     return url
 
-# --- HELPER: RESET ENVIRONMENT ---
-def reset_environment():
-    """Clears the watch directory and database vectors."""
-    # 1. Cleanup Files
-    if os.path.exists(WATCH_DIR):
-        def on_rm_error(func, path, exc_info):
-            os.chmod(path, 0o777)
-            func(path)
-        shutil.rmtree(WATCH_DIR, onerror=on_rm_error)
-    
-    # 2. Clear Database
-    # 2. Clear Database
-    try:
-        conn = psycopg2.connect(config.get_db_url())
-        cur = conn.cursor()
-        cur.execute("TRUNCATE TABLE code_vectors RESTART IDENTITY CASCADE;")
-        conn.commit()
-        conn.close()
-        st.toast("🧹 Previous data cleared.")
-    except Exception as e:
-        # Stop execution if we can't clear the old data
-        st.error(f"Failed to clear database: {e}")
-        raise e
-
-    # 3. Reset Session State
-    if "messages" in st.session_state:
-        st.session_state["messages"] = []
-    if "trigger_query" in st.session_state:
-        del st.session_state["trigger_query"]
+# --- HELPER: RESET SESSION ---
+def reset_session():
+    """
+    Starts a fresh analysis for this session. The previous repository's job is retired,
+    so the worker removes its workspace (and its vectors) in the background.
+    """
+    previous_job = st.session_state.pop("job_id", None)
+    if previous_job is not None:
+        jobs.retire_job(previous_job)
+
+    for key in ["repo_loaded", "workspace", "current_repo_url", "current_branch", "trigger_query", "last_turn"]:
+        if key in st.session_state:
+            del st.session_state[key]
+
+def start_job(kind, source, repo_url):
+    reset_session()
+    st.session_state["job_id"] = jobs.enqueue_job(kind, source)
+    # The previous transcript stays in chat_store; this repository gets a new one
+    chat_session.start_session(st.session_state["job_id"])
+    st.session_state["pending_repo_url"] = repo_url
+
+# --- HELPER: JOB STATUS PANEL ---
+# Polls only the job's row (cheap primary-key read); the clone and indexing run in worker.py.
+@st.fragment(run_every=2)
+def job_status_panel():
+    job_id = st.session_state.get("job_id")
+    job = jobs.get_job(job_id) if job_id is not None else None
+    if job is None:
+        return
+
+    with st.container(border=True):
+        st.progress(job["progress"])
+        st.write(f"⚙️ {job['message']}")
+
+        if job["status"] in jobs.ACTIVE_STATES:
+            if st.button("✖️ Cancel", key=f"cancel_{job_id}"):
+                jobs.request_cancel(job_id)
+        elif job["status"] == "ready":
+            # Store Metadata
+            st.session_state["current_repo_url"] = st.session_state.get("pending_repo_url", "").replace(".git", "")
+            st.session_state["current_branch"] = job["branch"] or "main"
+            st.session_state["workspace"] = job["workspace"]
+            st.session_state["repo_loaded"] = True
+            if job["chunks"]:
+                st.success("✅ Repository Ready!")
+            else:
+                st.warning("⚠️ Indexing is slow, but proceeding.")
+            if st.button("📊 Open Overview", type="primary", use_container_width=True, key=f"open_{job_id}"):
+                st.switch_page("pages/overview.py")
+        elif job["status"] == "failed":
+            st.error(job["message"])
+        elif job["status"] == "cancelled":
+            st.info("Analysis cancelled.")
 
 # --- INPUT SECTION ---
 st.subheader("Start your analysis")
@@ -85,62 +117,15 @@ with tab1:
     if st.button("🚀 Analyze Repository", type="primary", use_container_width=True):
         if not repo_url_input:
             st.error("Please enter a valid GitHub URL.")
+        elif not repo_url_input.strip().startswith(("https://", "http://")):
+            # The worker refuses anything else too (see worker.clone_repo)
+            st.error("Please enter an http(s) repository URL.")
         else:
-            repo_url = normalize_github_url(repo_url_input)
-            
-            with st.container(border=True):
-                progress = st.progress(0)
-                st.write("🔄 Preparing environment...")
-                
-                try:
-                    reset_environment()
-                    progress.progress(25)
-                    
-                    # Clone
-                    st.write(f"⬇️ Cloning {repo_url}...")
-                    os.makedirs(WATCH_DIR, exist_ok=True)
-                    repo = Repo.clone_from(repo_url, WATCH_DIR)
-                    progress.progress(50)
-                    
-                    # Store Metadata
-                    st.session_state["current_repo_url"] = repo_url.replace(".git", "") 
-                    st.session_state["current_branch"] = repo.active_branch.name
-                    st.session_state["repo_loaded"] = True
-                    
-                    # Wait for Indexing
-                    st.write("⚙️ Indexing code vectors...")
-                    
-                    # ... Polling Logic ...
-                    max_retries = 30
-                    retry_count = 0
-                    vectors_found = False
-                    
-                    while retry_count < max_retries:
-                        try:
-                            conn = psycopg2.connect(config.get_db_url())
-                            cur = conn.cursor()
-                            cur.execute("SELECT count(*) FROM code_vectors")
-                            count = cur.fetchone()[0]
-                            conn.close()
-                            if count > 0:
-                                vectors_found = True
-                                break
-                        except:
-                            pass
-                        time.sleep(1)
-                        retry_count += 1
-                        progress.progress(50 + int((retry_count / max_retries) * 40))
-
-                    if not vectors_found:
-                        st.warning("⚠️ Indexing is slow, but proceeding.")
-                    
-                    progress.progress(100)
-                    st.success("✅ Repository Ready!")
-                    time.sleep(1)
-                    st.switch_page("pages/overview.py")
-                    
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            repo_url = normalize_github_url(repo_url_input.strip())
+            try:
+                start_job("github", repo_url, repo_url)
+            except Exception as e:
+                st.error(f"Error: {e}")
 
 # --- TAB 2: ZIP UPLOAD ---
 with tab2:
@@ -148,60 +133,18 @@ with tab2:
     
     if uploaded_file is not None:
         if st.button("🚀 Analyze ZIP", type="primary", use_container_width=True):
-            with st.container(border=True):
-                progress = st.progress(0)
-                st.write("🔄 Preparing environment...")
-                
-                try:
-                    reset_environment()
-                    progress.progress(25)
-                    
-                    # Extract Zip
-                    st.write("📂 Extracting files...")
-                    os.makedirs(WATCH_DIR, exist_ok=True)
-                    
-                    with zipfile.ZipFile(uploaded_file, 'r') as zip_ref:
-                        zip_ref.extractall(WATCH_DIR)
-                        
-                    progress.progress(50)
-                    
-                    # Store Metadata
-                    st.session_state["current_repo_url"] = "" # No URL for local files
-                    st.session_state["current_branch"] = "main"
-                    st.session_state["repo_loaded"] = True
-                    
-                    # Wait for Indexing
-                    st.write("⚙️ Indexing code vectors...")
-                    
-                    # ... Polling Logic (Duplicated for now, could be helper) ...
-                    max_retries = 30
-                    retry_count = 0
-                    vectors_found = False
-                    
-                    while retry_count < max_retries:
-                        try:
-                            conn = psycopg2.connect(config.get_db_url())
-                            cur = conn.cursor()
-                            cur.execute("SELECT count(*) FROM code_vectors")
-                            count = cur.fetchone()[0]
-                            conn.close()
-                            if count > 0:
-                                vectors_found = True
-                                break
-                        except:
-                            pass
-                        time.sleep(1)
-                        retry_count += 1
-                        progress.progress(50 + int((retry_count / max_retries) * 40))
-
-                    progress.progress(100)
-                    st.success("✅ Project Ready!")
-                    time.sleep(1)
-                    st.switch_page("pages/overview.py")
-                    
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            try:
+                # Hand the upload over to the workers through the shared upload folder
+                os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+                zip_path = os.path.join(config.UPLOAD_DIR, f"{uuid.uuid4().hex}.zip")
+                with open(zip_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+                start_job("zip", zip_path, "") # No URL for local files
+            except Exception as e:
+                st.error(f"Error: {e}")
+
+job_status_panel()
 
 # Footer
 st.markdown("---")
-st.caption("Powered by Gemini 2.5 Flash & pgvector")
\ No newline at end of file
+st.caption("Powered by Gemini 2.5 Flash & pgvector")
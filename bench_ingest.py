@@ -0,0 +1,239 @@
+"""
+Ingestion throughput benchmark on synthetic repositories.
+
+Generates repos of 1k / 10k / 100k files with mixed languages, runs the
+code_indexing_flow against a dedicated local Postgres database (recreated for every
+size, so the real index is never touched) and reports files/sec, chunks/sec,
+estimated embedding and DB-write time shares, peak RSS and final index size.
+
+The shares are estimates, not in-run measurements: embedding runs inside CocoIndex's
+engine where it can't be timed separately, so a sample of each stage is re-run in
+isolation after the flow and scaled to the full chunk count.
+
+    python bench_ingest.py --sizes 1000 10000 --output bench_ingest.json
+    python bench_ingest.py --sizes 1000 --mode incremental
+
+Each size runs in a fresh child process so peak RSS is measured per run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import urlparse, urlunparse
+
+import psycopg2
+
+import config
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+BENCH_DB_NAME = "vectordb_bench"
+EMBED_SAMPLE = 512   # Chunks re-embedded to estimate the embedding share
+WRITE_SAMPLE = 512   # Rows re-written to estimate the DB write share
+
+# --- SYNTHETIC REPOSITORIES ---
+# Weighted mix roughly like a web project; only extensions the flow indexes are counted.
+LANGUAGE_MIX = [(".py", 0.45), (".js", 0.35), (".md", 0.20)]
+WORDS = ["user", "session", "config", "cache", "index", "token", "request", "render",
+         "parse", "store", "query", "vector", "client", "handler", "model", "event"]
+
+def _python_file(rng, n):
+    funcs = []
+    for i in range(rng.randint(3, 12)):
+        name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}"
+        body = "\n".join(f"    {rng.choice(WORDS)} = {rng.choice(WORDS)}({i}, '{rng.choice(WORDS)}')" for _ in range(rng.randint(2, 10)))
+        funcs.append(f"def {name}({rng.choice(WORDS)}, {rng.choice(WORDS)}=None):\n    \"\"\"{' '.join(rng.choices(WORDS, k=12))}\"\"\"\n{body}\n    return {rng.choice(WORDS)}\n")
+    return f"import os\nimport json\n\n# module {n}\n\n" + "\n\n".join(funcs)
+
+def _js_file(rng, n):
+    funcs = []
+    for i in range(rng.randint(3, 12)):
+        name = f"{rng.choice(WORDS)}{rng.choice(WORDS).title()}{i}"
+        body = "\n".join(f"  const {rng.choice(WORDS)}{j} = {rng.choice(WORDS)}.{rng.choice(WORDS)}({i});" for j in range(rng.randint(2, 10)))
+        funcs.append(f"export function {name}({rng.choice(WORDS)}) {{\n{body}\n  return {rng.choice(WORDS)};\n}}\n")
+    return f"// module {n}\nimport {{ {rng.choice(WORDS)} }} from './{rng.choice(WORDS)}';\n\n" + "\n".join(funcs)
+
+def _md_file(rng, n):
+    sections = []
+    for i in range(rng.randint(2, 6)):
+        sections.append(f"## {rng.choice(WORDS).title()} {i}\n\n" + " ".join(rng.choices(WORDS, k=rng.randint(40, 160))) + "\n")
+    return f"# Document {n}\n\n" + "\n".join(sections)
+
+GENERATORS = {".py": _python_file, ".js": _js_file, ".md": _md_file}
+
+def generate_repo(root, num_files, seed=7):
+    """
+    Writes a deterministic synthetic repository (nested packages, ~50 files per folder).
+    Re-uses an existing one with the same file count.
+    """
+    marker = os.path.join(root, ".bench_files")
+    if os.path.exists(marker) and open(marker).read().strip() == str(num_files):
+        return root
+
+    rng = random.Random(seed)
+    extensions = [ext for ext, _ in LANGUAGE_MIX]
+    weights = [w for _, w in LANGUAGE_MIX]
+    for n in range(num_files):
+        ext = rng.choices(extensions, weights)[0]
+        folder = os.path.join(root, f"pkg{n // 2500}", f"mod{(n // 50) % 50}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{rng.choice(WORDS)}_{n}{ext}"), "w") as f:
+            f.write(GENERATORS[ext](rng, n))
+    with open(marker, "w") as f:
+        f.write(str(num_files))
+    return root
+
+
+# --- BENCH DATABASE ---
+def bench_db_url(base_url):
+    parsed = urlparse(base_url)
+    return urlunparse(parsed._replace(path=f"/{BENCH_DB_NAME}"))
+
+def recreate_bench_db(base_url):
+    admin = psycopg2.connect(base_url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {BENCH_DB_NAME}")
+        cur.execute(f"CREATE DATABASE {BENCH_DB_NAME}")
+    admin.close()
+    conn = psycopg2.connect(bench_db_url(base_url))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    conn.close()
+
+
+# --- CHILD: ONE MEASURED RUN ---
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def estimate_embed_seconds(cur, total_chunks):
+    from sentence_transformers import SentenceTransformer
+    cur.execute("SELECT text FROM code_vectors ORDER BY random() LIMIT %s", (EMBED_SAMPLE,))
+    texts = [row[0] for row in cur.fetchall()]
+    if not texts:
+        return 0.0
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    model.encode(texts[:8])  # Warm-up
+    start = time.perf_counter()
+    model.encode(texts)
+    return (time.perf_counter() - start) / len(texts) * total_chunks
+
+def estimate_write_seconds(cur, total_chunks):
+    cur.execute("CREATE TEMP TABLE bench_write (LIKE code_vectors INCLUDING ALL)")
+    cur.execute("SELECT * FROM code_vectors LIMIT %s", (WRITE_SAMPLE,))
+    rows = cur.fetchall()
+    if not rows:
+        return 0.0
+    placeholders = ", ".join(["%s"] * len(rows[0]))
+    start = time.perf_counter()
+    cur.executemany(f"INSERT INTO bench_write VALUES ({placeholders})", rows)
+    cur.connection.commit()
+    return (time.perf_counter() - start) / len(rows) * total_chunks
+
+def run_one(repo_dir, mode):
+    """
+    Runs inside the child process; SOURCEIQ_WATCH_DIR / COCOINDEX_DATABASE_URL are set by the parent.
+    """
+    import ingest
+
+    start = time.perf_counter()
+    ingest.code_indexing_flow.setup()
+    ingest.ensure_metadata_indexes()
+    setup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode == "bulk":
+        ingest.bulk_initial_load()
+    else:
+        ingest.code_indexing_flow.update()
+    index_seconds = time.perf_counter() - start
+    # Before the estimates below, which load a second model and fetch samples
+    peak_rss = peak_rss_mb()
+
+    conn = psycopg2.connect(config.get_db_url())
+    cur = conn.cursor()
+    cur.execute("SELECT count(*), count(DISTINCT filename) FROM code_vectors")
+    chunks, files = cur.fetchone()
+    cur.execute("SELECT pg_total_relation_size('code_vectors'), pg_indexes_size('code_vectors')")
+    total_bytes, index_bytes = cur.fetchone()
+    embed_seconds = estimate_embed_seconds(cur, chunks)
+    write_seconds = estimate_write_seconds(cur, chunks)
+    conn.close()
+
+    return {
+        "mode": mode,
+        "files_indexed": files,
+        "chunks": chunks,
+        "setup_seconds": round(setup_seconds, 2),
+        "index_seconds": round(index_seconds, 2),
+        "files_per_sec": round(files / index_seconds, 1) if index_seconds else 0.0,
+        "chunks_per_sec": round(chunks / index_seconds, 1) if index_seconds else 0.0,
+        # Estimated from re-running a sample of each stage in isolation (see module docstring)
+        "embed_time_share_estimate": round(min(1.0, embed_seconds / index_seconds), 3) if index_seconds else 0.0,
+        "db_write_time_share_estimate": round(min(1.0, write_seconds / index_seconds), 3) if index_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss, 1),
+        "table_size_mb": round(total_bytes / 1024 / 1024, 1),
+        "index_size_mb": round(index_bytes / 1024 / 1024, 1),
+    }
+
+
+# --- PARENT: ORCHESTRATION ---
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion throughput benchmark on synthetic repositories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Repository sizes (files)")
+    parser.add_argument("--mode", choices=["bulk", "incremental"], default="bulk", help="Initial-load path to measure")
+    parser.add_argument("--workdir", default=os.path.abspath("./bench_repos"), help="Where synthetic repos are generated")
+    parser.add_argument("--db-url", default=config.get_db_url(), help="Server to create the bench database on")
+    parser.add_argument("--output", default="bench_ingest.json", help="Machine-readable results file")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)  # Internal: child process entry point
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.mode)))
+        return
+
+    results = []
+    for size in args.sizes:
+        repo_dir = os.path.join(args.workdir, f"repo_{size}")
+        print(f"🧪 Generating synthetic repo with {size} files...")
+        generate_repo(repo_dir, size)
+
+        recreate_bench_db(args.db_url)
+        env = dict(os.environ, SOURCEIQ_WATCH_DIR=repo_dir, COCOINDEX_DATABASE_URL=bench_db_url(args.db_url))
+        print(f"⏱️  Indexing {size} files ({args.mode})...")
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-one", repo_dir, "--mode", args.mode],
+            env=env, capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            print(f"⚠️ Run for {size} files failed:\n{child.stderr[-2000:]}")
+            continue
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        result["files_generated"] = size
+        results.append(result)
+        print(json.dumps(result, indent=2))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
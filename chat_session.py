@@ -0,0 +1,116 @@
+import time
+import streamlit as st
+import config
+import jobs
+import chat_store
+from conversation_memory import ConversationMemory
+
+# --- CHAT SESSION STATE ---
+# st.session_state.messages is a bounded window over the transcript in chat_store:
+# new messages are persisted first, and the oldest ones are dropped from the window
+# (after being folded into the conversation summary). The transcript id is kept in
+# the page URL (?chat=...), so a reconnect picks the conversation up again.
+
+def start_session(job_id=None):
+    """
+    Starts a fresh transcript for this browser session (e.g. a new repository).
+    """
+    st.session_state["chat_session"] = chat_store.create_session(job_id)
+    st.session_state["messages"] = []
+    st.session_state["memory"] = ConversationMemory()
+    st.session_state["history_pages"] = 0
+
+def _restore_repo(job_id):
+    # The job row still knows which workspace/branch the conversation was about
+    job = jobs.get_job(job_id) if job_id is not None else None
+    if job is None or job["status"] != "ready":
+        return
+    st.session_state["job_id"] = job_id
+    st.session_state["workspace"] = job["workspace"]
+    st.session_state["current_branch"] = job["branch"] or "main"
+    st.session_state["current_repo_url"] = job["source"].replace(".git", "") if job["kind"] == "github" else ""
+    st.session_state["repo_loaded"] = True
+
+def ensure_session():
+    """
+    Makes sure this browser session has a transcript: the current one, the one named
+    in the URL (after a reconnect/restart), or a new one.
+    """
+    if "chat_session" not in st.session_state:
+        session_id = st.query_params.get("chat")
+        session = chat_store.get_session(session_id) if session_id else None
+        if session is None:
+            if "repo_loaded" not in st.session_state:
+                return  # Nothing to talk about yet
+            start_session(st.session_state.get("job_id"))
+        else:
+            messages = chat_store.recent_messages(session["id"], config.CHAT_WINDOW_MESSAGES)
+            memory = ConversationMemory()
+            memory.summary = session["summary"]
+            memory.summarized_upto = sum(1 for m in messages if m["id"] <= session["summarized_through"])
+            st.session_state["chat_session"] = session["id"]
+            st.session_state["messages"] = messages
+            st.session_state["memory"] = memory
+            st.session_state["history_pages"] = 0
+            if "repo_loaded" not in st.session_state:
+                _restore_repo(session["job_id"])
+    st.query_params["chat"] = st.session_state["chat_session"]
+
+def add_message(role, content):
+    """
+    Persists a message and appends it to the in-memory window, trimming the window
+    back to CHAT_WINDOW_MESSAGES.
+    """
+    ensure_session()
+    message_id = chat_store.append_message(st.session_state["chat_session"], role, content)
+    messages = st.session_state["messages"]
+    messages.append({"id": message_id, "role": role, "content": content})
+
+    overflow = len(messages) - config.CHAT_WINDOW_MESSAGES
+    if overflow > 0:
+        st.session_state["memory"].drop_oldest(messages[:overflow])
+        del messages[:overflow]
+
+def save_memory():
+    """
+    Persists the rolling summary with the id of the last message it covers.
+    """
+    messages = st.session_state.get("messages", [])
+    memory = st.session_state.get("memory")
+    if memory is None or not messages:
+        return
+    with memory.lock:
+        summary, upto = memory.summary, memory.summarized_upto
+    # Messages before the window are always covered by the summary
+    through = messages[upto - 1]["id"] if upto else messages[0]["id"] - 1
+    chat_store.save_summary(st.session_state["chat_session"], summary, through)
+
+def older_messages():
+    """
+    Returns (messages, has_more) for the turns before the window that the user asked
+    to see. They are fetched per rerun and never kept in the session.
+    """
+    messages = st.session_state.get("messages", [])
+    if not messages:
+        return [], False
+    first_id = messages[0]["id"]
+    pages = st.session_state.get("history_pages", 0)
+    if pages == 0:
+        return [], chat_store.has_messages_before(st.session_state["chat_session"], first_id)
+    limit = pages * config.CHAT_PAGE_SIZE
+    older = chat_store.messages_before(st.session_state["chat_session"], first_id, limit + 1)
+    return older[-limit:], len(older) > limit
+
+def show_more_history():
+    st.session_state["history_pages"] = st.session_state.get("history_pages", 0) + 1
+
+def touch_repo():
+    """
+    Keeps the session's job (workspace + vectors) from expiring while it is in use.
+    Throttled to one cheap UPDATE per minute.
+    """
+    job_id = st.session_state.get("job_id")
+    if job_id is None or time.time() - st.session_state.get("job_touched_at", 0) < 60:
+        return
+    jobs.touch_job(job_id)
+    st.session_state["job_touched_at"] = time.time()
@@ -0,0 +1,143 @@
+import uuid
+import psycopg2
+import psycopg2.extras
+import config
+
+# --- CHAT TRANSCRIPTS ---
+# Every message is persisted here as it is sent, so the webapp only keeps a bounded
+# window of recent turns per session (see chat_session.py). Older turns are paged in
+# for display on demand, and a session survives reconnects and restarts.
+# Long answers are compressed by Postgres itself (TOAST), so plain TEXT stays compact.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sourceiq_chat_sessions (
+    id TEXT PRIMARY KEY,
+    job_id BIGINT,                      -- Repository the conversation is about (sourceiq_jobs.id)
+    summary TEXT NOT NULL DEFAULT '',   -- Rolling summary of turns older than the window
+    summarized_through BIGINT NOT NULL DEFAULT 0,  -- Last message id folded into 'summary'
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS sourceiq_chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sourceiq_chat_sessions (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS sourceiq_chat_messages_session_idx ON sourceiq_chat_messages (session_id, id);
+"""
+
+def _connect():
+    conn = psycopg2.connect(config.get_db_url())
+    conn.autocommit = True
+    return conn
+
+def ensure_schema():
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA)
+    finally:
+        conn.close()
+
+def create_session(job_id=None):
+    """
+    Starts a new transcript and returns its id (safe to put in the page URL).
+    """
+    session_id = uuid.uuid4().hex
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO sourceiq_chat_sessions (id, job_id) VALUES (%s, %s)", (session_id, job_id))
+        return session_id
+    finally:
+        conn.close()
+
+def get_session(session_id):
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT * FROM sourceiq_chat_sessions WHERE id = %s", (session_id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+    finally:
+        conn.close()
+
+def append_message(session_id, role, content):
+    """
+    Persists one message and returns its id (ids increase in conversation order).
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO sourceiq_chat_messages (session_id, role, content) VALUES (%s, %s, %s) RETURNING id",
+                (session_id, role, content),
+            )
+            message_id = cur.fetchone()[0]
+            cur.execute("UPDATE sourceiq_chat_sessions SET updated_at = now() WHERE id = %s", (session_id,))
+            return message_id
+    finally:
+        conn.close()
+
+def recent_messages(session_id, limit):
+    """
+    The last 'limit' messages, oldest first.
+    """
+    return messages_before(session_id, None, limit)
+
+def messages_before(session_id, before_id, limit):
+    """
+    Up to 'limit' messages older than 'before_id' (all messages if None), oldest first.
+    Served by the (session_id, id) index, so paging cost doesn't grow with the transcript.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(
+                "SELECT id, role, content FROM sourceiq_chat_messages "
+                "WHERE session_id = %s AND (%s::bigint IS NULL OR id < %s) ORDER BY id DESC LIMIT %s",
+                (session_id, before_id, before_id, limit),
+            )
+            return [dict(row) for row in reversed(cur.fetchall())]
+    finally:
+        conn.close()
+
+def has_messages_before(session_id, before_id):
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT EXISTS (SELECT 1 FROM sourceiq_chat_messages WHERE session_id = %s AND id < %s)",
+                (session_id, before_id),
+            )
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def save_summary(session_id, summary, summarized_through):
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE sourceiq_chat_sessions SET summary = %s, summarized_through = %s, updated_at = now() WHERE id = %s",
+                (summary, summarized_through, session_id),
+            )
+    finally:
+        conn.close()
+
+def purge_sessions(retention_days):
+    """
+    Deletes transcripts untouched for 'retention_days' (their messages cascade).
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM sourceiq_chat_sessions WHERE updated_at < now() - make_interval(days => %s)",
+                (retention_days,),
+            )
+            return cur.rowcount
+    finally:
+        conn.close()
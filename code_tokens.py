@@ -0,0 +1,110 @@
+import re
+from dataclasses import dataclass
+
+# --- CODE-AWARE TOKENIZER ---
+# Shared by ingest (building the code_symbols inverted index) and retrieval (turning
+# a question into lookup terms), so both sides normalise identifiers the same way:
+#   getUserName / get_user_name / get-user-name  ->  getusername + get, user, name, username
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*[A-Za-z0-9]|[A-Za-z]{2,}")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+MIN_TERM_LENGTH = 2          # Keeps 'db', 'id', 'io', 'ui', 'api'
+MAX_SYMBOLS_PER_CHUNK = 96   # Bounds the size of code_symbols
+
+# English filler plus the most common language keywords; everything else is a candidate term
+STOP_WORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "in", "is", "it", "its", "me", "my", "of", "on", "or", "show", "so", "tell", "that",
+    "the", "this", "to", "use", "used", "uses", "was", "we", "what", "when", "where", "which",
+    "who", "why", "with", "work", "works", "you", "your", "there", "here", "about", "into",
+    "def", "class", "return", "import", "self", "none", "true", "false", "if", "else", "elif",
+    "not", "var", "let", "const", "function", "new", "this", "null", "undefined", "public",
+    "private", "static", "void", "int", "str", "pass", "try", "except", "finally", "while",
+}
+
+
+@dataclass
+class Symbol:
+    symbol: str
+    kind: str  # 'identifier' (whole normalised name) | 'part' (camel/snake component or joined pair)
+
+
+def split_identifier(identifier):
+    """
+    Splits camelCase, PascalCase, snake_case and kebab-case into lowercase parts.
+    """
+    parts = []
+    for piece in re.split(r"[_\-]+", identifier):
+        parts.extend(p.lower() for p in CAMEL_PATTERN.findall(piece))
+    return [p for p in parts if p]
+
+
+def normalize_identifier(identifier):
+    return re.sub(r"[_\-]+", "", identifier).lower()
+
+
+def _expand(identifier):
+    """
+    Returns (normalised identifier, parts + adjacent-part joins) for one identifier.
+    The joins let "user name" and "username" both reach getUserName.
+    """
+    parts = split_identifier(identifier)
+    joins = [a + b for a, b in zip(parts, parts[1:])]
+    return normalize_identifier(identifier), parts + joins
+
+
+def _is_term(term):
+    return len(term) >= MIN_TERM_LENGTH and term not in STOP_WORDS and not term.isdigit()
+
+
+def tokenize_query(text):
+    """
+    Turns a question into lookup terms: punctuation stripped, identifiers normalised
+    and split, filler words dropped. Order is preserved, duplicates removed.
+    """
+    terms = []
+    words = [w.strip("-_") for w in WORD_PATTERN.findall(text)]
+    lowered = [w.lower() for w in words]
+    for word in words:
+        identifier, parts = _expand(word)
+        for term in [identifier] + parts:
+            if _is_term(term) and term not in terms:
+                terms.append(term)
+    # Adjacent plain words may name one identifier ("user name" -> username)
+    for a, b in zip(lowered, lowered[1:]):
+        if _is_term(a) and _is_term(b) and a.isalpha() and b.isalpha() and a + b not in terms:
+            terms.append(a + b)
+    return terms
+
+
+def query_identifiers(text):
+    """
+    The question's words as written (punctuation stripped), for substring fallback search.
+    """
+    seen = []
+    for word in WORD_PATTERN.findall(text):
+        word = word.strip("-_")
+        if _is_term(word.lower()) and word not in seen:
+            seen.append(word)
+    return seen
+
+
+def extract_symbols(text):
+    """
+    Symbols of a code chunk for the inverted index (at most MAX_SYMBOLS_PER_CHUNK).
+    Whole identifiers come first so they survive the cap.
+    """
+    identifiers = {}
+    parts = {}
+    for word in WORD_PATTERN.findall(text):
+        identifier, word_parts = _expand(word.strip("-_"))
+        if _is_term(identifier):
+            identifiers.setdefault(identifier, None)
+        for part in word_parts:
+            if _is_term(part) and part != identifier:
+                parts.setdefault(part, None)
+
+    symbols = [Symbol(s, "identifier") for s in identifiers]
+    symbols += [Symbol(s, "part") for s in parts if s not in identifiers]
+    return symbols[:MAX_SYMBOLS_PER_CHUNK]
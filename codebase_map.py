@@ -0,0 +1,235 @@
+import os
+import hashlib
+
+# --- MAP LIMITS ---
+# Graphviz layout cost grows super-linearly with node count, so every rendered
+# level is capped and the overflow is rolled up into a single "+N more" node.
+MAX_CHILDREN = 12      # Folders/files shown per directory before rolling up
+MAX_NODES = 80         # Hard cap for the whole graph
+ORTHO_NODE_LIMIT = 40  # 'splines=ortho' is only affordable on small graphs
+
+FILE_COLORS = {
+    ".py": "#fdcb6e",   # Yellow
+    ".js": "#74b9ff",   # Blue
+    ".ts": "#74b9ff",
+    ".md": "#55efc4",   # Green
+    ".css": "#a29bfe",  # Purple
+}
+
+
+def scan_manifest(directory):
+    """
+    Walks the repository once and returns a per-directory manifest.
+
+    Each entry is keyed by the directory path relative to the root ("." for the root):
+        {"dirs": [...], "files": [(name, size), ...], "total_files": int, "total_bytes": int}
+    Totals are recursive, so any folder can be rendered as a single aggregated node.
+    """
+    manifest = {}
+
+    for root, dirs, files in os.walk(directory):
+        # Prune hidden folders (.git, .venv, ...) in-place so os.walk skips them
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+
+        rel_dir = os.path.relpath(root, directory).replace("\\", "/")
+        entries = []
+        for f in files:
+            try:
+                size = os.path.getsize(os.path.join(root, f))
+            except OSError:
+                size = 0
+            entries.append((f, size))
+        entries.sort(key=lambda e: e[1], reverse=True)
+
+        manifest[rel_dir] = {
+            "dirs": list(dirs),
+            "files": entries,
+            "total_files": len(entries),
+            "total_bytes": sum(size for _, size in entries),
+        }
+
+    # Roll totals up bottom-up (deepest paths first)
+    for rel_dir in sorted(manifest, key=lambda p: p.count("/"), reverse=True):
+        if rel_dir == ".":
+            continue
+        parent = os.path.dirname(rel_dir) or "."
+        if parent in manifest:
+            manifest[parent]["total_files"] += manifest[rel_dir]["total_files"]
+            manifest[parent]["total_bytes"] += manifest[rel_dir]["total_bytes"]
+
+    return manifest
+
+
+def manifest_signature(manifest):
+    """
+    Cheap fingerprint of a manifest, used as the cache key for generated layouts.
+    """
+    digest = hashlib.sha1()
+    for rel_dir in sorted(manifest):
+        entry = manifest[rel_dir]
+        digest.update(f"{rel_dir}|{entry['total_files']}|{entry['total_bytes']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def child_path(parent, name):
+    return name if parent == "." else f"{parent}/{name}"
+
+
+def format_size(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def _node_id(kind, path):
+    # Path-based IDs: two 'utils' folders in different places no longer collide
+    safe_path = path.replace("\\", "/").replace('"', '\\"')
+    return f'"{kind}:{safe_path}"'
+
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _folder_label(name, entry):
+    return f"{_escape(name)}\\n{entry['total_files']} files · {format_size(entry['total_bytes'])}"
+
+
+def build_map_dot(manifest, focus=".", max_depth=2, max_children=MAX_CHILDREN, max_nodes=MAX_NODES):
+    """
+    Builds a DOT string for the sub-tree rooted at 'focus'.
+
+    Folders are aggregated nodes labelled with their recursive file count and size.
+    Each level shows at most 'max_children' entries (largest first) plus a "+N more"
+    rollup node, and the whole graph never exceeds 'max_nodes' nodes.
+    An empty manifest (missing or purged directory) gives an empty graph.
+    """
+    if not manifest:
+        return 'digraph G {\nbgcolor="transparent";\n}'
+    if focus not in manifest:
+        focus = "."
+
+    nodes = []
+    edges = []
+
+    root_entry = manifest[focus]
+    root_name = "root" if focus == "." else os.path.basename(focus)
+    root_id = _node_id("d", focus)
+    root_label = _folder_label(root_name, root_entry)
+    nodes.append(f'{root_id} [label="{root_label}", fillcolor="#6C5CE7", fontcolor="white", penwidth=0];')
+
+    def expandable(path, depth):
+        entry = manifest[path]
+        return depth < max_depth and bool(entry["dirs"] or entry["files"])
+
+    # Breadth-first so the cap trims the deepest levels, not whole branches.
+    # Every queued folder keeps one node in reserve for its own "+N more" rollup,
+    # so a folder cut off by 'max_nodes' still says what it hides.
+    queue = [(focus, 0)]
+    reserved = 1 if expandable(focus, 0) else 0
+    while queue:
+        rel_dir, depth = queue.pop(0)
+        if not expandable(rel_dir, depth):
+            continue
+        reserved -= 1
+
+        entry = manifest[rel_dir]
+        parent_id = _node_id("d", rel_dir)
+
+        # Largest folders first, then largest files
+        sub_dirs = sorted(
+            (child_path(rel_dir, d) for d in entry["dirs"] if child_path(rel_dir, d) in manifest),
+            key=lambda p: manifest[p]["total_bytes"],
+            reverse=True,
+        )
+        children = [("d", p) for p in sub_dirs] + [("f", name, size) for name, size in entry["files"]]
+
+        free = max_nodes - len(nodes) - reserved - 1  # One for this folder's rollup
+        shown = []
+        for child in children[:max_children]:
+            cost = 2 if child[0] == "d" and expandable(child[1], depth + 1) else 1
+            if cost > free:
+                break
+            shown.append(child)
+            free -= cost
+        hidden = children[len(shown):]
+
+        for child in shown:
+            if child[0] == "d":
+                path = child[1]
+                sub = manifest[path]
+                label = _folder_label(os.path.basename(path), sub)
+                node_id = _node_id("d", path)
+                # Sleek Folder Node
+                nodes.append(f'{node_id} [label="{label}", fillcolor="#2d3436", fontcolor="white", color="#6C5CE7", penwidth=2];')
+                queue.append((path, depth + 1))
+                if expandable(path, depth + 1):
+                    reserved += 1
+            else:
+                _, name, size = child
+                node_id = _node_id("f", child_path(rel_dir, name))
+                color = FILE_COLORS.get(os.path.splitext(name)[1], "#b2bec3")  # Default Grey
+                nodes.append(f'{node_id} [label="{_escape(name)}", style="rounded,filled", fillcolor="#1E1E26", fontcolor="{color}", color="{color}", penwidth=1];')
+            edges.append(f"{parent_id} -> {node_id};")
+
+        if hidden:
+            hidden_files = sum(manifest[c[1]]["total_files"] if c[0] == "d" else 1 for c in hidden)
+            more_id = _node_id("more", rel_dir)
+            nodes.append(f'{more_id} [label="+{len(hidden)} more\\n{hidden_files} files", style="dashed,rounded", fontcolor="#b2bec3", color="#636e72", penwidth=1];')
+            edges.append(f"{parent_id} -> {more_id};")
+
+    splines = "ortho" if len(nodes) <= ORTHO_NODE_LIMIT else "polyline"
+    dot = [
+        'digraph G {',
+        'bgcolor="transparent";',
+        'rankdir=TB;',
+        f'splines={splines};',
+        'nodesep=0.6;',
+        'ranksep=1.0;',
+        'node [shape=box, style="filled,rounded", fontname="Inter", fontsize=12, margin="0.2,0.1"];',
+        'edge [penwidth=1.5, color="#636e72"];',
+    ]
+    dot.extend(nodes)
+    dot.extend(edges)
+    dot.append('}')
+    return "\n".join(dot)
+
+
+def drilldown_options(manifest, focus=".", limit=50):
+    """
+    Returns the sub-folders of 'focus' (largest first) that the user can drill into.
+    """
+    entry = manifest.get(focus)
+    if not entry:
+        return []
+    options = [child_path(focus, d) for d in entry["dirs"] if child_path(focus, d) in manifest]
+    options.sort(key=lambda p: manifest[p]["total_bytes"], reverse=True)
+    return options[:limit]
+
+
+def text_tree(manifest, focus=".", max_depth=2, max_children=MAX_CHILDREN):
+    """
+    Plain-text fallback of the same capped tree, for environments without Graphviz.
+    """
+    if not manifest:
+        return ""
+    lines = []
+
+    def walk(rel_dir, depth):
+        entry = manifest[rel_dir]
+        indent = "    " * depth
+        lines.append(f"{indent}{os.path.basename(rel_dir) if rel_dir != '.' else 'root'}/ ({entry['total_files']} files)")
+        if depth + 1 > max_depth:
+            return
+        sub_dirs = [child_path(rel_dir, d) for d in entry["dirs"] if child_path(rel_dir, d) in manifest]
+        for path in sub_dirs[:max_children]:
+            walk(path, depth + 1)
+        for name, _ in entry["files"][:max_children]:
+            lines.append(f"{indent}    {name}")
+        hidden = max(0, len(sub_dirs) - max_children) + max(0, len(entry["files"]) - max_children)
+        if hidden:
+            lines.append(f"{indent}    ... +{hidden} more")
+
+    walk(focus if focus in manifest else ".", 0)
+    return "\n".join(lines)
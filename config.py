@@ -17,4 +17,63 @@ def get_google_api_key():
     return api_key
 
 # Constants
-WATCH_DIR = os.path.abspath("./my_project_code")
+WATCH_DIR = os.path.abspath(os.environ.get("SOURCEIQ_WATCH_DIR", "./my_project_code"))
+UPLOAD_DIR = os.path.abspath("./uploads")  # ZIPs handed from the webapp to the workers
+
+# Files the indexer picks up (ingest.py); search filters only offer these
+INCLUDED_PATTERNS = ["*.py", "*.js", "*.md"]
+LANGUAGE_BY_EXTENSION = {".py": "python", ".js": "javascript", ".ts": "typescript", ".java": "java", ".md": "markdown"}
+
+# --- RETRIEVAL TUNING ---
+SEMANTIC_LIMIT = 4
+KEYWORD_LIMIT = 3
+
+# Optional cross-encoder rerank stage (runs locally on CPU)
+RERANK_ENABLED = os.environ.get("SOURCEIQ_RERANK", "0") == "1"
+RERANK_MODEL = os.environ.get("SOURCEIQ_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_SEMANTIC_POOL = 16   # Candidates fetched per strategy when reranking
+RERANK_KEYWORD_POOL = 8
+RERANK_TOP_K = 4            # Chunks kept after reranking
+RERANK_BATCH_SIZE = 8
+RERANK_BUDGET_MS = float(os.environ.get("SOURCEIQ_RERANK_BUDGET_MS", "400"))
+
+# Multi-query retrieval: raw question + identifiers + history-aware rewrite, searched in parallel
+MULTI_QUERY_ENABLED = os.environ.get("SOURCEIQ_MULTI_QUERY", "0") == "1"
+MULTI_QUERY_BUDGET_MS = float(os.environ.get("SOURCEIQ_MULTI_QUERY_BUDGET_MS", "1500"))
+
+# Shared Postgres connection pool used by retrieval
+DB_POOL_MAX = int(os.environ.get("SOURCEIQ_DB_POOL_MAX", "8"))
+
+# Bulk initial load (ingest.py --bulk): "auto" bulk-loads only when code_vectors is empty,
+# "never" always starts straight on the live path
+BULK_LOAD_MODE = os.environ.get("SOURCEIQ_BULK_LOAD", "auto")
+BULK_INDEX_WORKERS = int(os.environ.get("SOURCEIQ_BULK_INDEX_WORKERS", "4"))
+BULK_MAINTENANCE_WORK_MEM = os.environ.get("SOURCEIQ_BULK_MAINTENANCE_WORK_MEM", "1GB")
+
+# Background clone-and-index jobs (worker.py)
+JOB_WORKERS = int(os.environ.get("SOURCEIQ_JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = 1.0
+JOB_INDEX_TIMEOUT_SECONDS = int(os.environ.get("SOURCEIQ_JOB_INDEX_TIMEOUT", "120"))
+JOB_RETENTION_HOURS = int(os.environ.get("SOURCEIQ_JOB_RETENTION_HOURS", "24"))
+JOB_STALE_SECONDS = int(os.environ.get("SOURCEIQ_JOB_STALE_SECONDS", "120"))  # No heartbeat for this long = worker died
+JOB_MAX_ATTEMPTS = 2         # Stale jobs are requeued until they have been claimed this many times
+
+# Chat transcripts (chat_store.py): only the last CHAT_WINDOW_MESSAGES live in the session
+CHAT_WINDOW_MESSAGES = int(os.environ.get("SOURCEIQ_CHAT_WINDOW", "20"))
+CHAT_PAGE_SIZE = 20          # Older messages loaded per "Show earlier messages" click
+CHAT_RETENTION_DAYS = int(os.environ.get("SOURCEIQ_CHAT_RETENTION_DAYS", "30"))
+
+# Adaptive top-k (SOURCEIQ_ADAPTIVE_K=1): over-fetch, then cut at a relevance gap / score
+# floor, keeping at most ADAPTIVE_MAX_K chunks within CONTEXT_TOKEN_BUDGET
+ADAPTIVE_K_ENABLED = os.environ.get("SOURCEIQ_ADAPTIVE_K", "0") == "1"
+ADAPTIVE_SEMANTIC_POOL = 12   # Candidates fetched per strategy (cheap: same index scans)
+ADAPTIVE_KEYWORD_POOL = 8
+ADAPTIVE_MIN_K = 2            # Never fewer chunks than this (if retrieved at all)
+ADAPTIVE_MAX_K = int(os.environ.get("SOURCEIQ_ADAPTIVE_MAX_K", "8"))
+ADAPTIVE_MIN_SCORE = float(os.environ.get("SOURCEIQ_ADAPTIVE_MIN_SCORE", "0.2"))
+ADAPTIVE_GAP_RATIO = float(os.environ.get("SOURCEIQ_ADAPTIVE_GAP_RATIO", "0.2"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("SOURCEIQ_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Index snapshots (snapshot.py): warm start for repositories already indexed at the same commit
+SNAPSHOTS_ENABLED = os.environ.get("SOURCEIQ_SNAPSHOTS", "0") == "1"
+SNAPSHOT_DIR = os.path.abspath(os.environ.get("SOURCEIQ_SNAPSHOT_DIR", "./snapshots"))
@@ -0,0 +1,160 @@
+import threading
+
+# --- CONVERSATION MEMORY ---
+# Keeps the prompt's history section flat in size: recent turns are kept verbatim
+# inside a token budget, everything older is folded into a rolling summary.
+
+# Rough chars-per-token ratio for English/code; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+RECENT_BUDGET_TOKENS = 1200   # Verbatim recent turns
+SUMMARY_BUDGET_TOKENS = 300   # Rolling summary of older turns
+MESSAGE_CAP_TOKENS = 500      # A single long answer never eats the whole budget
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " …(truncated)"
+
+
+def _role_label(msg):
+    return "User" if msg["role"] == "user" else "Assistant"
+
+
+def fallback_summarize(previous_summary, messages, max_tokens):
+    """
+    Extractive summary used when no LLM summarizer is available (or it fails):
+    keeps the first line of every folded message.
+    """
+    lines = [previous_summary] if previous_summary else []
+    for msg in messages:
+        first_line = msg["content"].strip().splitlines()[0] if msg["content"].strip() else ""
+        lines.append(f"{_role_label(msg)}: {truncate_to_tokens(first_line, 40)}")
+    # Keep the most recent part of the summary when it overflows
+    summary = "\n".join(lines)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return summary[-max_chars:] if len(summary) > max_chars else summary
+
+
+class ConversationMemory:
+    """
+    Per-session memory. The summary is maintained incrementally: every message is
+    folded into it at most once, when it falls out of the recent-turns window.
+    Rendering never waits on the LLM: turns that left the window but are not folded
+    yet are shown through the extractive fallback until update() (run in the
+    background after the answer) folds them in.
+    """
+
+    def __init__(self, recent_budget_tokens=RECENT_BUDGET_TOKENS, summary_budget_tokens=SUMMARY_BUDGET_TOKENS):
+        self.recent_budget_tokens = recent_budget_tokens
+        self.summary_budget_tokens = summary_budget_tokens
+        self.summary = ""
+        self.summarized_upto = 0  # Number of leading messages already folded into the summary
+        self.version = 0  # Bumped on every change, so a slow background fold can tell it is stale
+        # update() and follow-up prompts run in background threads while the user reads the answer
+        self.lock = threading.Lock()
+
+    def reset(self):
+        self.summary = ""
+        self.summarized_upto = 0
+        self.version += 1
+
+    def copy(self):
+        """
+        Independent copy of the current state, for rendering speculatively (e.g. from a
+        background thread) without touching this session's memory.
+        """
+        clone = ConversationMemory(self.recent_budget_tokens, self.summary_budget_tokens)
+        with self.lock:
+            clone.summary = self.summary
+            clone.summarized_upto = self.summarized_upto
+        return clone
+
+    def drop_oldest(self, evicted):
+        """
+        Called when the oldest messages leave the caller's bounded window. Any of them
+        not yet in the summary are folded in with the extractive fallback, so trimming
+        the window never waits on an LLM call.
+        """
+        with self.lock:
+            unsummarized = evicted[self.summarized_upto:]
+            if unsummarized:
+                summary = fallback_summarize(self.summary, unsummarized, self.summary_budget_tokens)
+                self.summary = truncate_to_tokens(summary.strip(), self.summary_budget_tokens)
+            self.summarized_upto = max(0, self.summarized_upto - len(evicted))
+            self.version += 1
+
+    def _recent_start(self, messages, summarized_upto):
+        """Index of the oldest message that still fits in the verbatim window."""
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, summarized_upto - 1, -1):
+            cost = estimate_tokens(truncate_to_tokens(messages[i]["content"], MESSAGE_CAP_TOKENS))
+            if used + cost > self.recent_budget_tokens:
+                break
+            used += cost
+            start = i
+        return start
+
+    def update(self, messages, summarizer=None):
+        """
+        Folds messages that no longer fit the recent window into the rolling summary.
+        'summarizer(previous_summary, messages, max_tokens) -> str' is typically an LLM call;
+        it runs outside the lock, and its result is dropped if the memory changed meanwhile
+        (the next update() folds those turns again).
+        """
+        with self.lock:
+            # History was cleared (new repo / reset): start over
+            if len(messages) < self.summarized_upto:
+                self.reset()
+            start = self._recent_start(messages, self.summarized_upto)
+            evicted = messages[self.summarized_upto:start]
+            previous, version = self.summary, self.version
+        if not evicted:
+            return
+
+        try:
+            summary = summarizer(previous, evicted, self.summary_budget_tokens) if summarizer else None
+        except Exception as e:
+            print(f"⚠️ Summarization failed, using extractive fallback: {e}")
+            summary = None
+        if not summary:
+            summary = fallback_summarize(previous, evicted, self.summary_budget_tokens)
+
+        with self.lock:
+            if self.version != version:
+                return
+            self.summary = truncate_to_tokens(summary.strip(), self.summary_budget_tokens)
+            self.summarized_upto = start
+            self.version += 1
+
+    def render(self, messages):
+        """
+        Returns the history section for the prompt (empty string if there is no history).
+        Read-only: turns waiting for update() are folded extractively for this prompt only.
+        """
+        if not messages:
+            return ""
+        with self.lock:
+            summary, upto = self.summary, self.summarized_upto
+        if len(messages) < upto:
+            summary, upto = "", 0
+        start = self._recent_start(messages, upto)
+        pending = messages[upto:start]
+        if pending:
+            summary = fallback_summarize(summary, pending, self.summary_budget_tokens)
+            summary = truncate_to_tokens(summary.strip(), self.summary_budget_tokens)
+
+        history_str = "\nPREVIOUS CONVERSATION:\n"
+        if summary:
+            history_str += f"(Summary of earlier turns)\n{summary}\n\n"
+        for msg in messages[start:]:
+            content = truncate_to_tokens(msg["content"], MESSAGE_CAP_TOKENS)
+            history_str += f"{_role_label(msg)}: {content}\n"
+        return history_str
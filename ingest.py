@@ -1,11 +1,16 @@
 import os
+import argparse
 import cocoindex
+import psycopg2
 from datetime import timedelta
 from cocoindex.sources import LocalFile
 from cocoindex.targets import Postgres
 from cocoindex.functions import SplitRecursively, SentenceTransformerEmbed
 from cocoindex import FlowLiveUpdater
 import config
+import telemetry
+import code_tokens
+from code_tokens import Symbol
 
 # --- CONFIGURATION FIX ---
 # CocoIndex requires the connection to be set via this environment variable.
@@ -16,14 +21,130 @@ os.environ["COCOINDEX_DATABASE_URL"] = config.get_db_url()
 @cocoindex.op.function()
 def get_language(filename: str) -> str:
     ext = os.path.splitext(filename)[1]
-    mapping = {
-        ".py": "python",
-        ".js": "javascript",
-        ".ts": "typescript",
-        ".java": "java",
-        ".md": "markdown"
-    }
-    return mapping.get(ext, "text")
+    return config.LANGUAGE_BY_EXTENSION.get(ext, "text")
+
+# Metadata columns used for filter pushdown at query time (see search_filters.py)
+@cocoindex.op.function()
+def get_directory(filename: str) -> str:
+    return os.path.dirname(filename).replace("\\", "/")
+
+@cocoindex.op.function()
+def get_file_type(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+@cocoindex.op.function()
+def is_test_file(filename: str) -> bool:
+    path = filename.replace("\\", "/").lower()
+    name = os.path.basename(path)
+    parts = path.split("/")[:-1]
+    return (
+        any(p in ("test", "tests", "__tests__", "spec", "specs") for p in parts)
+        or name.startswith("test_")
+        or name.endswith(("_test.py", ".test.js", ".spec.js", ".test.ts", ".spec.ts"))
+    )
+
+# Identifiers (and their camel/snake parts) of each chunk, for the code_symbols inverted index
+@cocoindex.op.function()
+def extract_symbols(text: str) -> list[Symbol]:
+    return code_tokens.extract_symbols(text)
+
+# Plain B-tree indexes on the metadata columns (CocoIndex only manages the vector index).
+# text_pattern_ops lets "filename LIKE 'prefix%'" use the index regardless of collation.
+METADATA_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS code_vectors_language_idx ON code_vectors (language)",
+    "CREATE INDEX IF NOT EXISTS code_vectors_file_type_idx ON code_vectors (file_type)",
+    "CREATE INDEX IF NOT EXISTS code_vectors_is_test_idx ON code_vectors (is_test) WHERE is_test",
+    "CREATE INDEX IF NOT EXISTS code_vectors_filename_prefix_idx ON code_vectors (filename text_pattern_ops)",
+    # Exact symbol lookups scoped to one repository: WHERE symbol = ANY(...) AND filename LIKE 'job-N/%'
+    "CREATE INDEX IF NOT EXISTS code_symbols_symbol_filename_idx ON code_symbols (symbol, filename text_pattern_ops)",
+]
+# Superseded by the indexes above
+LEGACY_INDEXES = ["code_symbols_symbol_idx"]
+INDEXED_TABLES = ["code_vectors", "code_symbols"]
+
+def ensure_metadata_indexes():
+    conn = psycopg2.connect(config.get_db_url())
+    try:
+        with conn.cursor() as cur:
+            for sql in METADATA_INDEXES:
+                cur.execute(sql)
+            for name in LEGACY_INDEXES:
+                cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        conn.commit()
+    finally:
+        conn.close()
+
+# --- BULK INITIAL LOAD ---
+# Maintaining the HNSW index row-by-row is the slowest way to fill pgvector. For a
+# first-time load we drop the secondary indexes, let CocoIndex write every row in one
+# catch-up pass, then rebuild the indexes once with parallel maintenance workers.
+# This is a startup / full re-index tool: repositories queued later through jobs are
+# indexed by the live updater, because dropping indexes under running queries isn't safe.
+def table_row_count():
+    conn = psycopg2.connect(config.get_db_url())
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM code_vectors")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def drop_secondary_indexes():
+    """
+    Drops every non-primary-key index on the indexed tables and returns their
+    definitions (vector index included), so they can be recreated with the same names.
+    """
+    conn = psycopg2.connect(config.get_db_url())
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.indexname, i.indexdef
+                FROM pg_indexes i
+                JOIN pg_class c ON c.relname = i.indexname
+                JOIN pg_index x ON x.indexrelid = c.oid
+                WHERE i.tablename = ANY(%s) AND NOT x.indisprimary
+            """, (INDEXED_TABLES,))
+            definitions = cur.fetchall()
+            for name, _ in definitions:
+                cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        conn.commit()
+        return [definition for _, definition in definitions]
+    finally:
+        conn.close()
+
+def rebuild_indexes(definitions):
+    conn = psycopg2.connect(config.get_db_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SET max_parallel_maintenance_workers = {int(config.BULK_INDEX_WORKERS)}")
+            cur.execute("SET maintenance_work_mem = %s", (config.BULK_MAINTENANCE_WORK_MEM,))
+            for definition in definitions:
+                cur.execute(definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1))
+            for sql in METADATA_INDEXES:
+                cur.execute(sql)
+            for table in INDEXED_TABLES:
+                cur.execute(f"ANALYZE {table}")
+    finally:
+        conn.close()
+
+def bulk_initial_load():
+    """
+    One-shot load of the whole watch directory with indexes absent, then a single
+    index build. Leaves the table ready for live incremental updates.
+    """
+    with telemetry.span("ingest.bulk_drop_indexes"):
+        definitions = drop_secondary_indexes()
+    print(f"📦 Bulk load: dropped {len(definitions)} index(es), loading rows...")
+    try:
+        with telemetry.span("ingest.bulk_load"):
+            stats = code_indexing_flow.update()
+        print(f"📦 Bulk load complete: {stats}")
+    finally:
+        # Always restore the indexes, even if the load was interrupted
+        print("🏗️  Building indexes...")
+        with telemetry.span("ingest.bulk_build_indexes"):
+            rebuild_indexes(definitions)
 
 @cocoindex.flow_def(name="CodebaseRag")
 def code_indexing_flow(flow_builder, data_scope):
@@ -32,17 +153,21 @@ def code_indexing_flow(flow_builder, data_scope):
     data_scope["files"] = flow_builder.add_source(
         LocalFile(
             path=config.WATCH_DIR, 
-            included_patterns=["*.py", "*.js", "*.md"]
+            included_patterns=config.INCLUDED_PATTERNS
         ),
         refresh_interval=timedelta(seconds=10) 
     )
 
-    # 2. COLLECTOR: Create a collection point
+    # 2. COLLECTORS: Chunks (vectors) and their symbols (inverted index)
     vector_store = data_scope.add_collector()
+    symbol_store = data_scope.add_collector()
 
     # 3. TRANSFORM: Parse, Chunk, and Embed
     with data_scope["files"].row() as file:
         file["lang"] = file["filename"].transform(get_language)
+        file["directory"] = file["filename"].transform(get_directory)
+        file["file_type"] = file["filename"].transform(get_file_type)
+        file["is_test"] = file["filename"].transform(is_test_file)
         
         file["chunks"] = file["content"].transform(
             SplitRecursively(), 
@@ -59,10 +184,25 @@ def code_indexing_flow(flow_builder, data_scope):
             vector_store.collect(
                 filename=file["filename"],
                 location=chunk["location"],
+                language=file["lang"],
+                directory=file["directory"],
+                file_type=file["file_type"],
+                is_test=file["is_test"],
+                start_pos=chunk["start"],  # {offset, line, column}: lets the UI deep-link line ranges
+                end_pos=chunk["end"],
                 text=chunk["text"],
                 embedding=chunk["embedding"]
             )
 
+            chunk["symbols"] = chunk["text"].transform(extract_symbols)
+            with chunk["symbols"].row() as symbol:
+                symbol_store.collect(
+                    filename=file["filename"],
+                    location=chunk["location"],
+                    symbol=symbol["symbol"],
+                    kind=symbol["kind"]
+                )
+
     # 4. EXPORT: Save to Postgres
     # FIX: No connection args here! It uses COCOINDEX_DATABASE_URL automatically.
     vector_store.export(
@@ -77,16 +217,44 @@ def code_indexing_flow(flow_builder, data_scope):
         ]
     )
 
+    # Inverted symbol index: symbol -> chunks (see code_tokens.py)
+    symbol_store.export(
+        "code_symbols",
+        Postgres(table_name="code_symbols"),
+        primary_key_fields=["filename", "location", "symbol"]
+    )
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CocoIndex codebase indexer")
+    parser.add_argument(
+        "--bulk", choices=["auto", "never"], default=config.BULK_LOAD_MODE,
+        help="Bulk initial load with deferred index build, only ever into an empty code_vectors",
+    )
+    args = parser.parse_args()
+    if args.bulk not in ("auto", "never"):
+        # argparse doesn't check defaults, so a bad SOURCEIQ_BULK_LOAD lands here
+        parser.error(f"invalid SOURCEIQ_BULK_LOAD: {args.bulk!r} (choose 'auto' or 'never')")
+
+    telemetry.start_metrics_server()
+
     print("🛠️  Setting up database tables...")
     # This creates the tables using the COCOINDEX_DATABASE_URL defined at the top
-    code_indexing_flow.setup()
+    with telemetry.trace(), telemetry.span("ingest.setup"):
+        code_indexing_flow.setup()
+        ensure_metadata_indexes()
+
+    # Never on a filled table: dropping the vector/metadata indexes would stall every
+    # query against the existing rows (jobs always go through the live path)
+    if args.bulk == "auto" and table_row_count() == 0:
+        with telemetry.trace():
+            bulk_initial_load()
     
     print("🚀 Starting Live Codebase Indexer... (Press Ctrl+C to stop)")
     updater = FlowLiveUpdater(code_indexing_flow)
     
     try:
-        updater.start()
+        with telemetry.span("ingest.start"):
+            updater.start()
         updater.wait()
     except KeyboardInterrupt:
         print("\n🛑 Stopping indexer...")
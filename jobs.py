@@ -0,0 +1,277 @@
+import os
+import psycopg2
+import psycopg2.extras
+import config
+
+# --- JOB QUEUE ---
+# Clone/extract + indexing jobs are persisted in Postgres so the web UI only enqueues
+# and polls, while worker processes (worker.py) do the slow work. Each job gets its
+# own workspace folder under WATCH_DIR, so several repositories can be analysed at once.
+
+# Job lifecycle: queued -> acquiring -> indexing -> ready
+#                any non-final state -> cancelled | failed
+# Finished jobs are 'retired' when superseded; the worker then deletes their workspace.
+# Running jobs heartbeat through updated_at; a job whose worker died is requeued (or
+# failed after JOB_MAX_ATTEMPTS claims) by recover_stale_jobs.
+ACTIVE_STATES = ("queued", "acquiring", "indexing")
+FINAL_STATES = ("ready", "failed", "cancelled", "retired")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sourceiq_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,                 -- 'github' | 'zip'
+    source TEXT NOT NULL,               -- Repository URL or path of the uploaded ZIP
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    branch TEXT,
+    workspace TEXT,                     -- Folder name under WATCH_DIR (= filename prefix in code_vectors)
+    chunks INT NOT NULL DEFAULT 0,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    purged BOOLEAN NOT NULL DEFAULT FALSE,
+    worker TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS sourceiq_jobs_queued_idx ON sourceiq_jobs (id) WHERE status = 'queued';
+ALTER TABLE sourceiq_jobs ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0;
+"""
+
+def _connect():
+    conn = psycopg2.connect(config.get_db_url())
+    conn.autocommit = True
+    return conn
+
+def ensure_schema():
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SCHEMA)
+    finally:
+        conn.close()
+
+def workspace_name(job_id):
+    return f"job-{job_id}"
+
+def workspace_dir(job):
+    return os.path.join(config.WATCH_DIR, job["workspace"])
+
+def enqueue_job(kind, source):
+    """
+    Queues a new job and returns its id.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            # Take the id first so the row is inserted complete: a worker may claim it
+            # the moment it is visible, and must never see it without a workspace
+            cur.execute("SELECT nextval(pg_get_serial_sequence('sourceiq_jobs', 'id'))")
+            job_id = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO sourceiq_jobs (id, kind, source, workspace, message) "
+                "VALUES (%s, %s, %s, %s, 'Waiting for a worker...')",
+                (job_id, kind, source, workspace_name(job_id)),
+            )
+            return job_id
+    finally:
+        conn.close()
+
+def get_job(job_id):
+    """
+    Cheap status lookup (primary-key read) used by the UI to poll.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT * FROM sourceiq_jobs WHERE id = %s", (job_id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+    finally:
+        conn.close()
+
+def request_cancel(job_id):
+    """
+    Queued jobs are cancelled immediately; running ones stop at the worker's next checkpoint.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE sourceiq_jobs SET status = 'cancelled', message = 'Cancelled', updated_at = now() "
+                "WHERE id = %s AND status = 'queued'",
+                (job_id,),
+            )
+            cur.execute(
+                "UPDATE sourceiq_jobs SET cancel_requested = TRUE, updated_at = now() WHERE id = %s AND status = ANY(%s)",
+                (job_id, list(ACTIVE_STATES)),
+            )
+    finally:
+        conn.close()
+
+def retire_job(job_id):
+    """
+    Marks a job as no longer needed (e.g. the session loaded another repo); the worker
+    then removes its workspace, which also removes its rows from the index.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE sourceiq_jobs SET cancel_requested = TRUE, updated_at = now() WHERE id = %s AND status = ANY(%s)",
+                (job_id, list(ACTIVE_STATES)),
+            )
+            cur.execute(
+                "UPDATE sourceiq_jobs SET status = 'retired', updated_at = now() WHERE id = %s AND status = 'ready'",
+                (job_id,),
+            )
+    finally:
+        conn.close()
+
+def claim_next_job(worker_name):
+    """
+    Atomically takes the oldest queued job. SKIP LOCKED lets many workers poll the
+    same table without blocking each other or double-claiming.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("""
+                UPDATE sourceiq_jobs SET status = 'acquiring', worker = %s, message = 'Starting...',
+                    attempts = attempts + 1, updated_at = now()
+                WHERE id = (
+                    SELECT id FROM sourceiq_jobs WHERE status = 'queued'
+                    ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+            """, (worker_name,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+    finally:
+        conn.close()
+
+def update_job(job_id, **fields):
+    if not fields:
+        return
+    assignments = ", ".join(f"{name} = %s" for name in fields)
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE sourceiq_jobs SET {assignments}, updated_at = now() WHERE id = %s",
+                list(fields.values()) + [job_id],
+            )
+    finally:
+        conn.close()
+
+def heartbeat(job_id):
+    """
+    Marks a running job as alive and returns whether a cancel was requested.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE sourceiq_jobs SET updated_at = now() WHERE id = %s RETURNING cancel_requested",
+                (job_id,),
+            )
+            row = cur.fetchone()
+            return bool(row and row[0])
+    finally:
+        conn.close()
+
+def touch_job(job_id):
+    """
+    Called while a session uses a ready job, so retention counts from its last use.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE sourceiq_jobs SET updated_at = now() WHERE id = %s AND status = 'ready'", (job_id,))
+    finally:
+        conn.close()
+
+def recover_stale_jobs(stale_seconds, max_attempts):
+    """
+    Active jobs without a heartbeat for 'stale_seconds' lost their worker. Cancelled
+    ones are closed, others go back to the queue or fail after 'max_attempts' claims.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            stale = "status IN ('acquiring', 'indexing') AND updated_at < now() - make_interval(secs => %s)"
+            cur.execute(
+                f"UPDATE sourceiq_jobs SET status = 'cancelled', message = 'Cancelled', updated_at = now() "
+                f"WHERE {stale} AND cancel_requested",
+                (stale_seconds,),
+            )
+            cur.execute(
+                f"UPDATE sourceiq_jobs SET status = 'queued', progress = 0, worker = NULL, "
+                f"message = 'Worker lost, waiting for another worker...', updated_at = now() "
+                f"WHERE {stale} AND attempts < %s",
+                (stale_seconds, max_attempts),
+            )
+            cur.execute(
+                f"UPDATE sourceiq_jobs SET status = 'failed', message = 'Error: worker lost', updated_at = now() "
+                f"WHERE {stale}",
+                (stale_seconds,),
+            )
+    finally:
+        conn.close()
+
+def count_indexed_chunks(workspace):
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM code_vectors WHERE filename LIKE %s", (f"{workspace}/%",))
+            return cur.fetchone()[0]
+    except psycopg2.Error:
+        # Table not created yet (indexer still starting)
+        return 0
+    finally:
+        conn.close()
+
+def count_indexed_files(workspace):
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(DISTINCT filename) FROM code_vectors WHERE filename LIKE %s", (f"{workspace}/%",))
+            return cur.fetchone()[0]
+    except psycopg2.Error:
+        return 0
+    finally:
+        conn.close()
+
+def delete_workspace_rows(workspace):
+    """
+    Removes a workspace's rows from the index. Rows loaded from a snapshot are not
+    tracked by CocoIndex, so deleting the folder alone would leave them behind.
+    """
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            for table in ("code_vectors", "code_symbols"):
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+                if cur.fetchone()[0]:
+                    cur.execute(f"DELETE FROM {table} WHERE filename LIKE %s", (f"{workspace}/%",))
+    finally:
+        conn.close()
+
+def jobs_to_purge(retention_hours):
+    """
+    Jobs whose workspace can be deleted: retired/cancelled/failed ones, plus ready
+    jobs untouched for 'retention_hours' (sessions that never came back).
+    """
+    conn = _connect()
+    try:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(
+                "UPDATE sourceiq_jobs SET status = 'retired', updated_at = now() "
+                "WHERE status = 'ready' AND updated_at < now() - make_interval(hours => %s)",
+                (retention_hours,),
+            )
+            cur.execute(
+                "SELECT * FROM sourceiq_jobs WHERE NOT purged AND status IN ('retired', 'cancelled', 'failed')"
+            )
+            return [dict(row) for row in cur.fetchall()]
+    finally:
+        conn.close()
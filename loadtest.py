@@ -0,0 +1,405 @@
+"""
+Concurrent-session load test for the webapp backend.
+
+Simulates N chat sessions calling generate_answer (and through it retrieve_context)
+against a local Postgres/pgvector database, with a deterministic stub in place of
+Gemini. Reports throughput, latency percentiles, DB connection counts and memory
+per session.
+
+    python loadtest.py --sessions 20 --turns 5
+    python loadtest.py --sessions 50 --turns 3 --seed-rows 20000 --json loadtest.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+import config
+import code_tokens
+
+QUESTIONS = [
+    "Where is the main entry point defined?",
+    "How does the database connection get configured?",
+    "Explain the retry logic for API calls.",
+    "Which function splits files into chunks?",
+    "How are embeddings computed for the code?",
+    "Where are the tests for the API client?",
+    "What does the frontend render on the landing page?",
+    "How is the GitHub URL normalized?",
+]
+
+EMBEDDING_DIM = 384  # sentence-transformers/all-MiniLM-L6-v2
+
+# --- GEMINI STUB ---
+class _StubUsage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+class _StubResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _StubUsage(len(prompt) // 4, len(text) // 4)
+
+class StubModel:
+    """
+    Deterministic stand-in for genai.GenerativeModel: fixed latency, answer derived
+    from the prompt hash, so runs are comparable and cost nothing.
+    """
+    def __init__(self, latency_ms=800):
+        self.latency_ms = latency_ms
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency_ms / 1000)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+        return _StubResponse(f"Stub answer {digest}. See the cited files for details.\n" * 8, prompt)
+
+
+# --- FIXTURE ---
+FIXTURE_DDL = f"""
+CREATE EXTENSION IF NOT EXISTS vector;
+CREATE TABLE IF NOT EXISTS code_vectors (
+    filename TEXT NOT NULL,
+    location INT8RANGE NOT NULL,
+    language TEXT,
+    directory TEXT,
+    file_type TEXT,
+    is_test BOOLEAN,
+    start_pos JSONB,
+    end_pos JSONB,
+    text TEXT,
+    embedding VECTOR({EMBEDDING_DIM}),
+    PRIMARY KEY (filename, location)
+);
+CREATE TABLE IF NOT EXISTS code_symbols (
+    filename TEXT NOT NULL,
+    location INT8RANGE NOT NULL,
+    symbol TEXT NOT NULL,
+    kind TEXT,
+    PRIMARY KEY (filename, location, symbol)
+);
+CREATE INDEX IF NOT EXISTS code_symbols_symbol_filename_idx ON code_symbols (symbol, filename text_pattern_ops);
+CREATE INDEX IF NOT EXISTS code_vectors_embedding_idx ON code_vectors USING hnsw (embedding vector_cosine_ops);
+"""
+
+def _insert_symbols(cur, chunks):
+    """
+    Fills code_symbols for (filename, location, text) chunks, like the indexer does.
+    """
+    rows = [
+        (filename, location, s.symbol, s.kind)
+        for filename, location, text in chunks
+        for s in code_tokens.extract_symbols(text)
+    ]
+    cur.executemany(
+        "INSERT INTO code_symbols VALUES (%s, %s::int8range, %s, %s) ON CONFLICT DO NOTHING",
+        rows,
+    )
+
+def seed_fixture(db_url, rows):
+    """
+    Creates code_vectors/code_symbols if needed and fills them with synthetic chunks
+    when code_vectors is empty.
+    Existing data is never touched.
+    """
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute(FIXTURE_DDL)
+    cur.execute("SELECT count(*) FROM code_vectors")
+    existing = cur.fetchone()[0]
+    if existing:
+        print(f"📦 Using existing code_vectors ({existing} rows).")
+        cur.execute("SELECT NOT EXISTS (SELECT 1 FROM code_symbols)")
+        if cur.fetchone()[0]:
+            # Fixture from before the symbol index: backfill it so keyword search is exercised
+            print("🌱 Backfilling code_symbols...")
+            cur.execute("SELECT filename, location::text, text FROM code_vectors")
+            _insert_symbols(cur, cur.fetchall())
+        conn.commit()
+        conn.close()
+        return existing
+
+    print(f"🌱 Seeding {rows} synthetic chunks...")
+    rng = random.Random(42)
+    batch = []
+    for i in range(rows):
+        batch.append(_synthetic_row(rng, i))
+        if len(batch) == 1000 or i == rows - 1:
+            _insert_vectors(cur, batch)
+            _insert_symbols(cur, [(row[0], row[1], row[8]) for row in batch])
+            batch = []
+    conn.commit()
+    conn.close()
+    return rows
+
+WORDS = ["config", "database", "retry", "embedding", "chunk", "render", "client", "session", "parse", "index"]
+
+def _unit_vector(rng):
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIM)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+def _synthetic_row(rng, i, root=""):
+    folder = root + f"pkg{i % 50}" + ("/tests" if i % 10 == 0 else "")
+    filename = f"{folder}/module_{i // 8}.py"
+    start = (i % 8) * 512
+    text = f"def {rng.choice(WORDS)}_{i}():\n    # {' '.join(rng.choices(WORDS, k=40))}\n    return {i}\n"
+    return (
+        filename, f"[{start},{start + 512})", "python", os.path.dirname(filename), ".py", "/tests" in folder,
+        json.dumps({"offset": start, "line": start // 40 + 1, "column": 0}),
+        json.dumps({"offset": start + 512, "line": (start + 512) // 40 + 1, "column": 0}),
+        text, str(_unit_vector(rng)),
+    )
+
+def _insert_vectors(cur, batch):
+    cur.executemany(
+        "INSERT INTO code_vectors VALUES (%s, %s::int8range, %s, %s, %s, %s, %s, %s, %s, %s::vector)",
+        batch,
+    )
+
+
+# --- FILTERED RECALL ---
+# pgvector applies the workspace filter after the HNSW scan. With several repositories
+# in one table, a small workspace must still get its nearest chunks: this case seeds
+# workspaces of very different sizes and compares the filtered vector search that
+# retrieval runs against an exact scan of the same workspace.
+RECALL_WORKSPACE_PREFIX = "loadtest-ws"
+
+def seed_workspaces(db_url, sizes):
+    """
+    Makes sure a synthetic workspace exists for every size (re-seeded only if its row
+    count differs) and returns their names. They are kept for later runs.
+    """
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute(FIXTURE_DDL)
+    names = []
+    for i, size in enumerate(sizes):
+        name = f"{RECALL_WORKSPACE_PREFIX}{i}-{size}"
+        cur.execute("SELECT count(*) FROM code_vectors WHERE filename LIKE %s", (f"{name}/%",))
+        if cur.fetchone()[0] != size:
+            print(f"🌱 Seeding workspace {name} ({size} chunks)...")
+            cur.execute("DELETE FROM code_vectors WHERE filename LIKE %s", (f"{name}/%",))
+            rng = random.Random(1000 + i)
+            for start in range(0, size, 1000):
+                _insert_vectors(cur, [_synthetic_row(rng, j, root=f"{name}/") for j in range(start, min(start + 1000, size))])
+            conn.commit()
+        names.append(name)
+    conn.commit()
+    conn.close()
+    return names
+
+def measure_workspace_recall(db_url, rag_engine, workspaces, queries, k):
+    """
+    Per workspace: recall@k of retrieval's filtered vector search against an exact
+    (index-free) scan, plus the vector search latency.
+    """
+    from search_filters import SearchFilters
+
+    rng = random.Random(7)
+    exact_conn = psycopg2.connect(db_url)
+    exact_conn.autocommit = True
+    exact_cur = exact_conn.cursor()
+    exact_cur.execute("SET enable_indexscan = off")
+    exact_cur.execute("SET enable_bitmapscan = off")
+
+    report = {}
+    for name in workspaces:
+        recalls, latencies = [], []
+        for _ in range(queries):
+            vector = _unit_vector(rng)
+            start = time.perf_counter()
+            with rag_engine.pooled_connection() as conn, conn.cursor() as cur:
+                semantic, _ = rag_engine._search(cur, "", vector, SearchFilters(workspace=name), k, 0)
+            latencies.append(time.perf_counter() - start)
+
+            exact_cur.execute(
+                "SELECT filename, location::text FROM code_vectors WHERE filename LIKE %s "
+                "ORDER BY embedding <=> %s::vector LIMIT %s",
+                (f"{name}/%", str(vector), k),
+            )
+            exact = set(exact_cur.fetchall())
+            found = {chunk.key for chunk in semantic}
+            recalls.append(len(exact & found) / len(exact) if exact else 1.0)
+        report[name] = {
+            "recall_at_k": round(sum(recalls) / len(recalls), 3),
+            "min_recall": round(min(recalls), 3),
+            "vector_search": summarize(latencies),
+        }
+    exact_conn.close()
+    return report
+
+
+# --- MEASUREMENT HELPERS ---
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        # Non-Linux: peak RSS is the best available approximation (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p90_ms": round(percentile(values, 90) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+class ConnectionMonitor(threading.Thread):
+    """Samples pg_stat_activity for this database while the test runs."""
+
+    def __init__(self, db_url, interval=0.5):
+        super().__init__(daemon=True)
+        self.db_url = db_url
+        self.interval = interval
+        self.samples = []
+        self.rss_samples = []
+        self.stop_event = threading.Event()
+
+    def run(self):
+        conn = psycopg2.connect(self.db_url)
+        conn.autocommit = True
+        cur = conn.cursor()
+        while not self.stop_event.is_set():
+            cur.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()")
+            # Exclude the monitor's own connection
+            self.samples.append(cur.fetchone()[0] - 1)
+            self.rss_samples.append(current_rss_mb())
+            self.stop_event.wait(self.interval)
+        conn.close()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+# --- SESSION DRIVER ---
+def run_session(session_id, turns, think_ms, rag_engine, results):
+    from conversation_memory import ConversationMemory
+
+    rng = random.Random(session_id)
+    messages = []
+    memory = ConversationMemory()
+    for turn in range(turns):
+        query = QUESTIONS[(session_id + turn) % len(QUESTIONS)]
+        messages.append({"role": "user", "content": query})
+        start = time.perf_counter()
+        try:
+            answer, _ = rag_engine.generate_answer(query, messages, memory=memory)
+            results["answer"].append(time.perf_counter() - start)
+            messages.append({"role": "assistant", "content": answer})
+        except Exception as e:
+            results["errors"].append(f"{type(e).__name__}: {e}")
+        if think_ms:
+            time.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat-session load test (Gemini stubbed).")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=5, help="Questions per session")
+    parser.add_argument("--think-ms", type=int, default=0, help="Mean pause between turns")
+    parser.add_argument("--llm-latency-ms", type=int, default=800, help="Simulated Gemini latency")
+    parser.add_argument("--seed-rows", type=int, default=5000, help="Synthetic rows if code_vectors is empty")
+    parser.add_argument("--db-url", default=config.get_db_url())
+    parser.add_argument("--recall-workspaces", default="",
+                        help="Comma-separated workspace sizes (e.g. 50,2000,20000) for the filtered recall check")
+    parser.add_argument("--recall-queries", type=int, default=20, help="Random queries per workspace")
+    parser.add_argument("--json", dest="json_path", help="Write the report to this file")
+    args = parser.parse_args()
+
+    # rag_engine reads the DB URL at call time; set it before import for consistency
+    os.environ["COCOINDEX_DATABASE_URL"] = args.db_url
+    seed_fixture(args.db_url, args.seed_rows)
+    recall_sizes = [int(size) for size in args.recall_workspaces.split(",") if size.strip()]
+    workspaces = seed_workspaces(args.db_url, recall_sizes) if recall_sizes else []
+
+    baseline_rss = current_rss_mb()
+    import rag_engine
+    rag_engine.model = StubModel(args.llm_latency_ms)
+
+    # Time retrieval separately from the full answer
+    results = {"answer": [], "retrieve": [], "errors": []}
+    original_retrieve = rag_engine.retrieve_context
+
+    def timed_retrieve(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return original_retrieve(*a, **kw)
+        finally:
+            results["retrieve"].append(time.perf_counter() - start)
+    rag_engine.retrieve_context = timed_retrieve
+
+    # Warm-up: load models and caches outside the measured window
+    rag_engine.generate_answer(QUESTIONS[0], [])
+    results = {"answer": [], "retrieve": [], "errors": []}
+    warm_rss = current_rss_mb()
+
+    monitor = ConnectionMonitor(args.db_url)
+    monitor.start()
+    print(f"🏋️  Running {args.sessions} sessions x {args.turns} turns...")
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        for session_id in range(args.sessions):
+            pool.submit(run_session, session_id, args.turns, args.think_ms, rag_engine, results)
+    wall = time.perf_counter() - wall_start
+    monitor.stop()
+
+    peak_rss = max(monitor.rss_samples + [current_rss_mb()])
+    report = {
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "llm_latency_ms": args.llm_latency_ms,
+        "wall_seconds": round(wall, 2),
+        "throughput_answers_per_s": round(len(results["answer"]) / wall, 2) if wall else 0.0,
+        "answer": summarize(results["answer"]),
+        "retrieve": summarize(results["retrieve"]),
+        "errors": len(results["errors"]),
+        "db_connections": {
+            "peak": max(monitor.samples, default=0),
+            "avg": round(sum(monitor.samples) / len(monitor.samples), 1) if monitor.samples else 0.0,
+        },
+        "memory_mb": {
+            "baseline": round(baseline_rss, 1),
+            "after_warmup": round(warm_rss, 1),
+            "peak": round(peak_rss, 1),
+            "per_session": round((peak_rss - warm_rss) / args.sessions, 2),
+        },
+    }
+
+    if workspaces:
+        print(f"🎯 Measuring filtered vector recall across {len(workspaces)} workspaces...")
+        report["filtered_recall"] = measure_workspace_recall(
+            args.db_url, rag_engine, workspaces, args.recall_queries, config.SEMANTIC_LIMIT,
+        )
+
+    print(json.dumps(report, indent=2))
+    for error in results["errors"][:5]:
+        print(f"⚠️ {error}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
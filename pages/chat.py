@@ -1,64 +1,68 @@
 import streamlit as st
-import re
 from collections import defaultdict
-from rag_engine import generate_answer
+from rag_engine import generate_answer, generate_followup, prefetch_followups, fold_history, FOLLOW_UP_ACTIONS
+from search_filters import SearchFilters, INDEXED_LANGUAGES, INDEXED_FILE_TYPES
+import chat_session
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(page_title="Chat", page_icon="💬", layout="wide")
 
+# Picks the conversation (and its repository) back up after a reconnect
+chat_session.ensure_session()
+
 # --- SAFETY CHECK ---
 if "repo_loaded" not in st.session_state:
     st.warning("⚠️ No repository loaded. Please go to the **Home** page first.")
     st.stop()
 
+# Retention counts from the last use, not from when the repository was loaded
+chat_session.touch_repo()
+
 import styles
 styles.apply_custom_styles()
 
 st.markdown('<h1 class="gradient-text">💬 Chat with Codebase</h1>', unsafe_allow_html=True)
 
-# --- HELPER: PARSE & GROUP CODE SNIPPETS ---
-def parse_and_group_sources(source_text):
+# --- HELPER: GROUP CODE SNIPPETS ---
+def group_sources(chunks):
     """
-    Parses raw source text from the backend and groups snippets by filename.
-    Returns a dictionary of merged content for each file.
+    Groups RetrievedChunk objects from the backend by filename.
+    Returns a dictionary of merged content (and line spans) for each file.
     """
-    # Regex to find our specific header format
-    pattern = r"--- FILE: (.*?) \(Match: (.*?)\) ---\n"
-    parts = re.split(pattern, source_text)
-    
     grouped_sources = defaultdict(list)
-    
-    # Iterate through regex matches (filename, type, content)
-    for i in range(1, len(parts), 3):
-        if i + 2 < len(parts):
-            filename = parts[i].strip()
-            match_type = parts[i+1].strip()
-            content = parts[i+2].strip()
-            
-            grouped_sources[filename].append({
-                "type": match_type,
-                "content": content
-            })
+    for chunk in chunks:
+        grouped_sources[chunk.filename].append(chunk)
 
     # Merge logic: Combine snippets from the same file into one block
     final_sources = {}
     for filename, snippets in grouped_sources.items():
+        # Show snippets in file order
+        snippets.sort(key=lambda c: c.start_line if c.start_line is not None else 0)
+
         # If any match was "semantic", we label the whole file as Semantic
-        is_semantic = any("semantic" in s["type"].lower() for s in snippets)
+        is_semantic = any(c.source == "semantic" for c in snippets)
         final_type = "Semantic" if is_semantic else "Keyword"
         
         # Join snippets with a clear visual separator
-        merged_content = "\n\n# ... (more context) ...\n\n".join([s["content"] for s in snippets])
+        merged_content = "\n\n# ... (more context) ...\n\n".join([c.text.strip() for c in snippets])
         
         final_sources[filename] = {
             "type": final_type,
-            "content": merged_content
+            "content": merged_content,
+            "spans": [c for c in snippets if c.start_line is not None],
+            "best_score": max(c.score for c in snippets),
         }
         
     return final_sources
 
+# --- HELPER: FOLLOW-UP ACTIONS ---
+def on_follow_up(pill_key):
+    action = st.session_state.get(pill_key)
+    if action:
+        st.session_state["trigger_followup"] = action
+
 # --- HELPER: RENDER THE DEEPWIKI UI ---
-def render_assistant_response(response_text, raw_sources):
+def render_assistant_response(response_text, sources):
     """
     Renders the Split View (Answer Left, Code Right)
     """
@@ -74,28 +78,24 @@ def render_assistant_response(response_text, raw_sources):
             st.divider()
             st.caption("Suggested Actions:")
             
-            # Modern "Pills" UI for suggestions
-            action = st.pills(
+            # Modern "Pills" UI for suggestions.
+            # The callback runs on the next rerun even though this widget isn't redrawn then.
+            pill_key = f"follow_up_{st.session_state.messages[-1]['id']}"
+            st.pills(
                 "Follow up:",
-                ["Explain Concepts", "Generate Test", "Security Check"],
-                selection_mode="single"
+                list(FOLLOW_UP_ACTIONS),
+                selection_mode="single",
+                key=pill_key,
+                on_change=on_follow_up,
+                args=(pill_key,),
             )
-            
-            if action:
-                query_map = {
-                    "Explain Concepts": "Explain the core concepts and logic in the code above.",
-                    "Generate Test": "Write a unit test for the code discussed above.",
-                    "Security Check": "Are there any security vulnerabilities or bad practices here?"
-                }
-                st.session_state["trigger_query"] = query_map[action]
-                st.rerun()
     
     # RIGHT COLUMN: The Referenced Code Cards
     with col2:
         st.markdown("### 📄 Context")
         with st.container(height=600):
-            if raw_sources.strip():
-                grouped_sources = parse_and_group_sources(raw_sources)
+            if sources:
+                grouped_sources = group_sources(sources)
                 
                 # Get Repo Info for Links
                 base_url = st.session_state.get("current_repo_url", "")
@@ -112,8 +112,11 @@ def render_assistant_response(response_text, raw_sources):
                         safe_filename = filename.replace("\\", "/")
                         file_url = f"{base_url}/blob/{branch}/{safe_filename}"
                         header_link = f"[{filename}]({file_url})"
+                        # Deep links to each matched line range
+                        span_links = [f"[{c.line_span}]({file_url}#{c.line_span})" for c in data["spans"]]
                     else:
                         header_link = filename
+                        span_links = [c.line_span for c in data["spans"]]
                     
                     # Render the Card
                     with st.container(border=True):
@@ -130,17 +133,45 @@ def render_assistant_response(response_text, raw_sources):
                         if filename.endswith(".java"): lang = "java"
                         
                         st.code(data['content'], language=lang)
-                        st.caption(f"Match Source: {data['type']}")
+                        caption = f"Match Source: {data['type']} · Score: {data['best_score']:.2f}"
+                        if span_links:
+                            caption += " · Lines: " + ", ".join(span_links)
+                        st.caption(caption)
             else:
                 st.info("No specific code references found for this answer.")
 
+# --- HELPER: SEARCH SCOPE (SIDEBAR) ---
+def get_search_filters():
+    """
+    Explicit filters from the sidebar. When none are set, the backend infers the
+    scope from the question instead.
+    """
+    with st.sidebar:
+        st.markdown("### 🎯 Search Scope")
+        languages = st.multiselect("Languages", INDEXED_LANGUAGES)
+        path_prefix = st.text_input("Path prefix", placeholder="src/api/")
+        file_types = st.multiselect("File types", INDEXED_FILE_TYPES)
+        tests_only = st.checkbox("Tests only")
+        st.caption("Leave empty to infer the scope from your question.")
+
+    # Always scoped to this session's repository; empty filters are inferred by the backend
+    return SearchFilters(
+        languages=languages,
+        path_prefixes=[path_prefix.strip()] if path_prefix.strip() else [],
+        file_types=file_types,
+        tests_only=tests_only,
+        workspace=st.session_state.get("workspace", ""),
+    )
+
 # --- MAIN EXECUTION FLOW ---
+search_filters = get_search_filters()
 
 # 1. Display Chat History
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-for message in st.session_state.messages:
+# Only the recent window lives in the session; earlier turns are paged in from the store
+older, has_more = chat_session.older_messages()
+if has_more:
+    st.button("⬆️ Show earlier messages", on_click=chat_session.show_more_history)
+for message in older + st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -150,15 +181,25 @@ process_query = None
 # Always render the chat input so it's visible
 user_input = st.chat_input("Ask a question about the code...")
 
+follow_up_action = None
+
 # A. Check for Auto-Trigger (from Overview Page)
 if "trigger_query" in st.session_state:
     process_query = st.session_state.pop("trigger_query")
     # Note: We don't append to 'messages' here because Overview page already did it
 
-# B. Check for Manual Input (Type in box)
+# B. Check for a Follow-up Pill (refers to the previous answer)
+elif "trigger_followup" in st.session_state:
+    follow_up_action = st.session_state.pop("trigger_followup")
+    process_query = FOLLOW_UP_ACTIONS[follow_up_action]
+    chat_session.add_message("user", process_query)
+    with st.chat_message("user"):
+        st.markdown(process_query)
+
+# C. Check for Manual Input (Type in box)
 elif user_input:
     process_query = user_input
-    st.session_state.messages.append({"role": "user", "content": process_query})
+    chat_session.add_message("user", process_query)
     with st.chat_message("user"):
         st.markdown(process_query)
 
@@ -166,11 +207,42 @@ elif user_input:
 if process_query:
     with st.chat_message("assistant"):
         with st.spinner("Analyzing codebase..."):
-            # Call Backend with History
-            answer, raw_sources = generate_answer(process_query, st.session_state.messages)
+            last_turn = st.session_state.get("last_turn")
+            if follow_up_action and last_turn:
+                # Reuse the referenced turn's context; the prompt is usually already prepared
+                prepared = None
+                try:
+                    prepared = last_turn["prepared"].result(timeout=10)
+                except Exception as e:
+                    print(f"⚠️ Follow-up prefetch unavailable: {e}")
+                answer, sources = generate_followup(
+                    follow_up_action,
+                    last_turn["chunks"],
+                    st.session_state.messages,
+                    memory=st.session_state.memory,
+                    prepared=prepared,
+                    filters=search_filters,
+                )
+            else:
+                # Call Backend with History
+                answer, sources = generate_answer(
+                    process_query,
+                    st.session_state.messages,
+                    memory=st.session_state.memory,
+                    filters=search_filters,
+                )
             
-            # Render UI
-            render_assistant_response(answer, raw_sources)
+            # Save to History (before rendering, so the pills are keyed to this turn)
+            chat_session.add_message("assistant", answer)
+            chat_session.save_memory()
+            # The LLM summary of older turns catches up in the background (saved next turn)
+            fold_history(list(st.session_state.messages), st.session_state.memory)
+
+            # Speculatively prepare follow-up prompts while the user reads the answer
+            st.session_state["last_turn"] = {
+                "chunks": sources,
+                "prepared": prefetch_followups(sources, st.session_state.messages, st.session_state.memory),
+            }
             
-            # Save to History
-            st.session_state.messages.append({"role": "assistant", "content": answer})
\ No newline at end of file
+            # Render UI
+            render_assistant_response(answer, sources)
\ No newline at end of file
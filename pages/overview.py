@@ -2,14 +2,22 @@ import streamlit as st
 import os
 from collections import Counter
 from rag_engine import generate_summary # Import the new function
+import codebase_map
+import config
+import chat_session
 
 st.set_page_config(page_title="Repo Overview", layout="wide")
-WATCH_DIR = "./my_project_code"
 
 if "repo_loaded" not in st.session_state:
     st.warning("⚠️ No repository loaded. Please go to the **Home** page first.")
     st.stop()
 
+# Retention counts from the last use, not from when the repository was loaded
+chat_session.touch_repo()
+
+# Each analysis job has its own workspace folder under WATCH_DIR
+REPO_DIR = os.path.join(config.WATCH_DIR, st.session_state.get("workspace", ""))
+
 # --- HELPER: GET FILE STATS ---
 def get_repo_details(directory):
     total_files = 0
@@ -41,14 +49,14 @@ st.markdown('<h1 class="gradient-text">📊 Smart Overview</h1>', unsafe_allow_h
 
 # --- LOAD DATA ---
 # (Cached to prevent re-running LLM on every click)
-# We pass 'repo_url' as an argument so Streamlit invalidates the cache when the repo changes
+# We pass 'repo_dir' as an argument so Streamlit invalidates the cache when the repo changes
 @st.cache_data(show_spinner=False)
-def get_ai_analysis(repo_url):
-    files_count, ext_counts, file_tree = get_repo_details(WATCH_DIR)
+def get_ai_analysis(repo_dir):
+    files_count, ext_counts, file_tree = get_repo_details(repo_dir)
     
     # Read README
     readme_text = ""
-    readme_path = os.path.join(WATCH_DIR, "README.md")
+    readme_path = os.path.join(repo_dir, "README.md")
     if os.path.exists(readme_path):
         with open(readme_path, "r", encoding="utf-8", errors="ignore") as f:
             readme_text = f.read()
@@ -57,11 +65,8 @@ def get_ai_analysis(repo_url):
     summary = generate_summary(readme_text, file_tree)
     return summary, files_count, ext_counts
 
-# Get the current repo URL to use as a cache key
-current_repo_url = st.session_state.get("current_repo_url", "unknown")
-
 with st.spinner("🤖 AI is analyzing the repository..."):
-    summary_text, total_files, tech_stack = get_ai_analysis(current_repo_url)
+    summary_text, total_files, tech_stack = get_ai_analysis(REPO_DIR)
 
 # 1. AI Summary Section
 styles.glass_card(summary_text)
@@ -71,71 +76,61 @@ st.divider()
 
 st.subheader("🗺️ Codebase Map")
 
-def build_graph(directory, max_depth=2):
-    """
-    Builds a DOT format string for Graphviz.
-    """
-    dot = [
-        'digraph G {',
-        'bgcolor="transparent";',
-        'rankdir=TB;', # Top to Bottom flow is usually easier to read
-        'splines=ortho;', # Orthogonal lines look cleaner
-        'nodesep=0.6;',
-        'ranksep=1.0;',
-        'node [shape=box, style="filled,rounded", fontname="Inter", fontsize=12, margin="0.2,0.1"];',
-        'edge [penwidth=1.5, color="#636e72"];'
-    ]
-    
-    # Root node
-    root_name = os.path.basename(directory)
-    dot.append(f'"{root_name}" [label="{root_name}", fillcolor="#6C5CE7", fontcolor="white", penwidth=0];')
-    
-    for root, dirs, files in os.walk(directory):
-        if ".git" in root: continue
-        
-        # Calculate depth
-        rel_path = os.path.relpath(root, directory)
-        current_depth = 0 if rel_path == "." else rel_path.count(os.sep) + 1
-        
-        if current_depth >= max_depth:
-            continue
-            
-        parent_node = os.path.basename(root)
-        if rel_path == ".": parent_node = root_name
-        
-        # Add Folders
-        for d in dirs:
-            if d.startswith("."): continue
-            # Sleek Folder Node
-            dot.append(f'"{d}" [label="{d}", fillcolor="#2d3436", fontcolor="white", color="#6C5CE7", penwidth=2];')
-            dot.append(f'"{parent_node}" -> "{d}";')
-            
-        # Add Files (limit to avoid noise)
-        for f in files[:8]: 
-            # Minimalist File Node
-            color = "#b2bec3" # Default Grey
-            if f.endswith(".py"): color = "#fdcb6e" # Yellow
-            elif f.endswith(".js") or f.endswith(".ts"): color = "#74b9ff" # Blue
-            elif f.endswith(".md"): color = "#55efc4" # Green
-            elif f.endswith(".css"): color = "#a29bfe" # Purple
-            
-            # White background with colored text/border
-            dot.append(f'"{f}" [label="{f}", style="rounded,filled", fillcolor="#1E1E26",fontcolor="{color}", color="{color}", penwidth=1];')
-            dot.append(f'"{parent_node}" -> "{f}";')
-            
-    dot.append('}')
-    return "\n".join(dot)
-
-graph_dot = build_graph(WATCH_DIR)
-
-# Render Graph safely
-try:
-    st.graphviz_chart(graph_dot)
-except Exception as e:
-    st.info("Visual map requires Graphviz. Showing file tree instead.")
-    st.text(file_tree if 'file_tree' in locals() else "No tree data.")
-
-# 3. "Ask from Anywhere" Section
+# The manifest (one os.walk) and each generated layout are cached separately:
+# drilling into a folder re-uses the manifest and only lays out the capped sub-tree.
+# cache_resource hands back the same (read-only) manifest on every rerun instead of
+# unpickling a copy of a potentially large dict each time.
+@st.cache_resource(show_spinner=False)
+def get_manifest(repo_dir):
+    manifest = codebase_map.scan_manifest(repo_dir)
+    return manifest, codebase_map.manifest_signature(manifest)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def get_map_layout(signature, focus, _manifest):
+    # '_manifest' is excluded from hashing; 'signature' identifies it
+    return codebase_map.build_map_dot(_manifest, focus=focus)
+
+manifest, signature = get_manifest(REPO_DIR)
+
+if not manifest:
+    # Workspace was purged (job retired/expired) or never extracted
+    st.info("📭 The repository files are no longer available. Load the repository again from the **Home** page.")
+else:
+    # Drill-down: the focus folder lives in session state and resets when the repo changes
+    if st.session_state.get("map_signature") != signature:
+        st.session_state["map_signature"] = signature
+        st.session_state["map_focus"] = "."
+    focus = st.session_state["map_focus"]
+
+    def drill_into():
+        picked = st.session_state.get("map_pick", "—")
+        if picked != "—":
+            st.session_state["map_focus"] = picked
+        st.session_state["map_pick"] = "—"
+
+    def drill_up():
+        st.session_state["map_focus"] = os.path.dirname(st.session_state["map_focus"]) or "."
+        st.session_state["map_pick"] = "—"
+
+    nav_col, pick_col = st.columns([1, 4])
+    with nav_col:
+        st.button("⬆️ Up", disabled=(focus == "."), on_click=drill_up, use_container_width=True)
+    with pick_col:
+        st.selectbox(
+            f"📁 {focus if focus != '.' else 'root'} — drill into folder",
+            ["—"] + codebase_map.drilldown_options(manifest, focus),
+            key="map_pick",
+            on_change=drill_into,
+        )
+
+    graph_dot = get_map_layout(signature, focus, manifest)
+
+    # Render Graph safely
+    try:
+        st.graphviz_chart(graph_dot)
+    except Exception as e:
+        st.info("Visual map requires Graphviz. Showing file tree instead.")
+        st.text(codebase_map.text_tree(manifest, focus))
 
 # 3. "Ask from Anywhere" Section
 st.subheader("💬 Start Investigating")
@@ -146,9 +141,7 @@ quick_prompt = st.chat_input("Ex: Where is the main entry point defined?")
 
 if quick_prompt:
     # 1. Save the question to session state so Chat page can see it
-    if "messages" not in st.session_state:
-        st.session_state["messages"] = []
-    st.session_state["messages"].append({"role": "user", "content": quick_prompt})
+    chat_session.add_message("user", quick_prompt)
     st.session_state["trigger_query"] = quick_prompt # Flag to trigger generation
     
     # 2. Redirect
@@ -0,0 +1,71 @@
+import re
+
+# --- QUERY EXPANSION ---
+# Cheap, local query variants for multi-query retrieval (no LLM round-trip):
+# the raw question, the code identifiers it mentions, and a history-aware rewrite.
+
+# snake_case, camelCase/PascalCase, dotted paths, file names and `backticked` tokens
+IDENTIFIER_PATTERN = re.compile(
+    r"`([^`]+)`"
+    r"|\b([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)+)\b"
+    r"|\b([a-z0-9]+(?:_[a-z0-9]+)+|_[A-Za-z0-9_]+)\b"
+    r"|\b([a-z]+[A-Z][A-Za-z0-9]*|[A-Z][a-z0-9]+[A-Z][A-Za-z0-9]*)\b"
+)
+
+# Words that make a question depend on the previous turn
+REFERENTIAL_WORDS = {"it", "its", "this", "that", "these", "those", "they", "them", "there", "above", "same"}
+
+
+def extract_identifiers(text):
+    """
+    Returns code-like identifiers mentioned in 'text', in order of appearance.
+    """
+    identifiers = []
+    for match in IDENTIFIER_PATTERN.finditer(text):
+        token = next(group for group in match.groups() if group)
+        token = token.strip().rstrip("()")
+        if token and token not in identifiers:
+            identifiers.append(token)
+    return identifiers
+
+
+def rewrite_with_history(query, chat_history):
+    """
+    Makes a follow-up question self-contained by borrowing the previous user question
+    when the new one is short or referential ("how is it tested?"). Returns None if
+    no rewrite is needed.
+    """
+    previous = [m["content"] for m in (chat_history or []) if m["role"] == "user" and m["content"] != query]
+    if not previous:
+        return None
+
+    words = re.findall(r"[a-z']+", query.lower())
+    if len(words) > 8 and not REFERENTIAL_WORDS.intersection(words):
+        return None
+
+    # Prefer the previous question's identifiers; fall back to the question itself
+    anchor = " ".join(extract_identifiers(previous[-1])) or previous[-1]
+    return f"{anchor} {query}"
+
+
+def build_query_variants(query, chat_history=None):
+    """
+    Returns [(variant_name, text), ...], raw question first, without duplicates.
+    """
+    variants = [("raw", query)]
+
+    identifiers = extract_identifiers(query)
+    if identifiers:
+        variants.append(("identifiers", " ".join(identifiers)))
+
+    rewrite = rewrite_with_history(query, chat_history)
+    if rewrite:
+        variants.append(("history", rewrite))
+
+    seen = set()
+    unique = []
+    for name, text in variants:
+        if text.strip() and text not in seen:
+            unique.append((name, text))
+            seen.add(text)
+    return unique
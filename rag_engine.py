@@ -1,10 +1,25 @@
 import os
 import psycopg2
+import psycopg2.errors
 import google.generativeai as genai
 from sentence_transformers import SentenceTransformer
 import config
+from conversation_memory import ConversationMemory
+import telemetry
+import reranker
+from search_filters import SearchFilters, infer_filters
 import time
 import random
+import threading
+import contextvars
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Optional
+from psycopg2.pool import ThreadedConnectionPool
+from query_expansion import build_query_variants
+import code_tokens
+import adaptive_k
 
 # --- CONFIGURATION ---
 api_key = config.get_google_api_key()
@@ -40,78 +55,338 @@ def retry_with_backoff(func):
                     raise e # Don't retry other errors (like 401 Auth)
     return wrapper
 
+telemetry.start_metrics_server()
+
 embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+if config.RERANK_ENABLED:
+    # Load the cross-encoder in the background; until it is ready the fused order is used
+    reranker.warm_up()
+
+# pgvector applies WHERE conditions (workspace, language, path) *after* the HNSW scan,
+# which only visits ~ef_search candidates: a small repository among large ones would
+# get few or no vector hits. Iterative scans (pgvector >= 0.8) keep walking the graph
+# until LIMIT rows pass the filter; strict_order keeps the results in distance order.
+VECTOR_SEARCH_OPTIONS = "-c hnsw.iterative_scan=strict_order"
 
 def get_db_connection():
-    return psycopg2.connect(config.get_db_url())
+    return psycopg2.connect(config.get_db_url(), options=VECTOR_SEARCH_OPTIONS)
+
+# --- CONNECTION POOL ---
+# Retrieval queries borrow connections from a shared pool instead of opening a new
+# one per request; multi-query retrieval runs several lookups on it in parallel.
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+_pool_slots = threading.BoundedSemaphore(config.DB_POOL_MAX)
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(1, config.DB_POOL_MAX, config.get_db_url(), options=VECTOR_SEARCH_OPTIONS)
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    pool = get_pool()
+    _pool_slots.acquire()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    broken = False
+    try:
+        # Read-only lookups: autocommit avoids leaving pooled connections "idle in transaction"
+        conn.autocommit = True
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken or bool(conn.closed))
+        _pool_slots.release()
+
+# --- RETRIEVAL RESULT ---
+@dataclass
+class RetrievedChunk:
+    """
+    One retrieved chunk. 'location' is the chunk's primary-key range in code_vectors,
+    'start_line'/'end_line' its line span in the file (None for rows indexed before
+    line spans were collected).
+    """
+    filename: str
+    location: str
+    text: str
+    score: float
+    source: str  # 'semantic' | 'keyword'
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+
+    @property
+    def key(self):
+        return (self.filename, self.location)
+
+    @property
+    def line_span(self):
+        if self.start_line is None:
+            return ""
+        if self.end_line is None or self.end_line == self.start_line:
+            return f"L{self.start_line}"
+        return f"L{self.start_line}-L{self.end_line}"
+
+# Columns shared by every retrieval query, in RetrievedChunk order (score/source are added per strategy)
+CHUNK_COLUMNS = "filename, location::text, text"
+LINE_COLUMNS = "(start_pos->>'line')::int as start_line, (end_pos->>'line')::int as end_line"
+
+def _row_to_chunk(row):
+    filename, location, text, score, source, start_line, end_line = row
+    return RetrievedChunk(filename, location, text, float(score), source, start_line, end_line)
+
+def _substring_search(cur, query, filter_sql, filter_params, keyword_limit):
+    identifiers = code_tokens.query_identifiers(query)
+    if not identifiers:
+        return []
+    # Create a dynamic SQL query: text ILIKE '%term1%' OR text ILIKE '%term2%'
+    conditions = " OR ".join(["text ILIKE %s" for _ in identifiers])
+    sql_keyword = f"""
+    SELECT {CHUNK_COLUMNS}, 0.9 as score, 'keyword' as source, {LINE_COLUMNS}
+    FROM code_vectors
+    WHERE ({conditions}) AND {filter_sql}
+    LIMIT %s;
+    """
+    # Add % wildcards for partial matching
+    params = [f"%{term}%" for term in identifiers] + filter_params + [keyword_limit]
+    rows = telemetry.timed_query(cur, "retrieve.keyword_scan_sql", sql_keyword, params)
+    return [_row_to_chunk(row) for row in rows]
+
+def _search(cur, query, query_vector, filters, semantic_limit, keyword_limit):
+    """
+    Runs both retrieval strategies with 'filters' pushed into their WHERE clauses.
+    Returns (semantic_results, keyword_results).
+    """
+    filter_sql, filter_params = filters.to_sql()
 
-def retrieve_context(query):
-    # Connect to Postgres using config
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     # ---------------------------------------------------------
     # STRATEGY A: SEMANTIC SEARCH (Vector)
     # ---------------------------------------------------------
-    query_vector = embedder.encode(query).tolist()
-    sql_vector = """
-    SELECT filename, text, 1 - (embedding <=> %s::vector) as score, 'semantic' as source
+    sql_vector = f"""
+    SELECT {CHUNK_COLUMNS}, 1 - (embedding <=> %s::vector) as score, 'semantic' as source, {LINE_COLUMNS}
     FROM code_vectors
-    ORDER BY score DESC LIMIT 4;
+    WHERE {filter_sql}
+    ORDER BY embedding <=> %s::vector LIMIT %s;
     """
-    cur.execute(sql_vector, (query_vector,))
-    semantic_results = cur.fetchall()
+    # Ordered by the raw distance (not 'score') so the HNSW index can serve it
+    params = [query_vector] + filter_params + [query_vector, semantic_limit]
+    rows = telemetry.timed_query(cur, "retrieve.vector_sql", sql_vector, params)
+    semantic_results = [_row_to_chunk(row) for row in rows]
 
     # ---------------------------------------------------------
-    # STRATEGY B: KEYWORD SEARCH (Exact Match)
+    # STRATEGY B: KEYWORD SEARCH (Symbol Index)
     # ---------------------------------------------------------
-    # Filter for significant words (len > 3) to avoid "the", "and", etc.
-    search_terms = [word for word in query.split() if len(word) > 3]
+    # Code-aware terms: 'run_llm()?' -> runllm/run/llm, 'user name' -> username; short
+    # identifiers like 'db' or 'id' are kept, filler words are dropped.
+    search_terms = code_tokens.tokenize_query(query)
     keyword_results = []
     
     if search_terms:
-        # Create a dynamic SQL query: text ILIKE '%term1%' OR text ILIKE '%term2%'
-        conditions = " OR ".join(["text ILIKE %s" for _ in search_terms])
+        # Indexed lookup in the code_symbols inverted index, ranked by matched terms.
+        # The repository/path scope is applied before grouping, so common parts like
+        # 'get' or 'id' only aggregate this repository's rows.
+        scope_sql, scope_params = filters.filename_sql()
         sql_keyword = f"""
-        SELECT filename, text, 0.9 as score, 'keyword' as source
+        SELECT {CHUNK_COLUMNS}, least(1.0, hits::float / %s) as score, 'keyword' as source, {LINE_COLUMNS}
         FROM code_vectors
-        WHERE {conditions}
-        LIMIT 3;
+        JOIN (
+            SELECT filename AS s_filename, location AS s_location,
+                   count(DISTINCT symbol) AS hits, bool_or(kind = 'identifier') AS exact
+            FROM code_symbols
+            WHERE symbol = ANY(%s) AND {scope_sql}
+            GROUP BY filename, location
+        ) s ON filename = s_filename AND location = s_location
+        WHERE {filter_sql}
+        ORDER BY hits DESC, exact DESC
+        LIMIT %s;
         """
-        # Add % wildcards for partial matching
-        params = [f"%{term}%" for term in search_terms]
-        cur.execute(sql_keyword, params)
-        keyword_results = cur.fetchall()
-    
-    conn.close()
-    
-    # ---------------------------------------------------------
-    # MERGE & DEDUPLICATE
-    # ---------------------------------------------------------
-    seen_texts = set()
+        params = [len(search_terms), search_terms] + scope_params + filter_params + [keyword_limit]
+        try:
+            rows = telemetry.timed_query(cur, "retrieve.keyword_sql", sql_keyword, params)
+            keyword_results = [_row_to_chunk(row) for row in rows]
+        except psycopg2.errors.UndefinedTable:
+            # Index built before code_symbols existed: fall back to a substring scan
+            keyword_results = _substring_search(cur, query, filter_sql, filter_params, keyword_limit)
+
+    return semantic_results, keyword_results
+
+def _merge(result_lists):
+    """
+    Merges ranked result lists, keeping the first occurrence of each row.
+    """
+    seen_keys = set()
     final_results = []
+    for results in result_lists:
+        for chunk in results:
+            if chunk.key not in seen_keys:
+                final_results.append(chunk)
+                seen_keys.add(chunk.key)
+    return final_results
+
+def _search_with_fallback(query, query_vector, filters, semantic_limit, keyword_limit):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        semantic_results, keyword_results = _search(cur, query, query_vector, filters, semantic_limit, keyword_limit)
+        if filters.inferred and not filters.is_empty() and not (semantic_results or keyword_results):
+            # A guessed filter must never turn an answerable question into "nothing found"
+            unfiltered = SearchFilters(workspace=filters.workspace)
+            semantic_results, keyword_results = _search(cur, query, query_vector, unfiltered, semantic_limit, keyword_limit)
+        cur.close()
+    return semantic_results, keyword_results
+
+@telemetry.traced("retrieve.total")
+def retrieve_context(query, rerank=None, filters=None, chat_history=None, multi_query=None, adaptive=None):
+    """
+    Hybrid retrieval. Returns a list of RetrievedChunk, semantic hits first.
+
+    With 'rerank' (default: config.RERANK_ENABLED) a wider candidate pool is fetched
+    and reordered by the local cross-encoder, keeping only the best few chunks.
+    'filters' (SearchFilters) restricts both strategies by language / path / file type;
+    when omitted they are inferred from the query, and dropped again if they match nothing.
+    With 'multi_query' (default: config.MULTI_QUERY_ENABLED) several query variants are
+    searched in parallel and fused (see retrieve_multi_query).
+    With 'adaptive' (default: config.ADAPTIVE_K_ENABLED) a cheap candidate pool is
+    over-fetched and the number of chunks is chosen per question (see adaptive_k.py).
+    """
+    if rerank is None:
+        rerank = config.RERANK_ENABLED
+    if multi_query is None:
+        multi_query = config.MULTI_QUERY_ENABLED
+    if adaptive is None:
+        adaptive = config.ADAPTIVE_K_ENABLED
+    if rerank:
+        semantic_limit, keyword_limit = config.RERANK_SEMANTIC_POOL, config.RERANK_KEYWORD_POOL
+    elif adaptive:
+        semantic_limit, keyword_limit = config.ADAPTIVE_SEMANTIC_POOL, config.ADAPTIVE_KEYWORD_POOL
+    else:
+        semantic_limit, keyword_limit = config.SEMANTIC_LIMIT, config.KEYWORD_LIMIT
+    if filters is None or filters.is_empty():
+        filters = infer_filters(query, workspace=filters.workspace if filters else "")
+
+    if multi_query:
+        final_results = retrieve_multi_query(query, filters, semantic_limit, keyword_limit, chat_history)
+    else:
+        with telemetry.span("retrieve.embed"):
+            query_vector = embedder.encode(query).tolist()
+
+        semantic_results, keyword_results = _search_with_fallback(query, query_vector, filters, semantic_limit, keyword_limit)
+
+        # ---------------------------------------------------------
+        # MERGE & DEDUPLICATE (by row identity)
+        # ---------------------------------------------------------
+        with telemetry.span("retrieve.merge"):
+            # Semantic Results First (High priority), then Keyword Results (Only if new)
+            final_results = _merge([semantic_results, keyword_results])
+
+    if rerank:
+        # With adaptive top-k the reranker only orders; the selection below decides k
+        final_results = reranker.rerank(query, final_results, top_k=config.ADAPTIVE_MAX_K if adaptive else None)
+
+    if adaptive:
+        with telemetry.span("retrieve.select", candidates=len(final_results)) as span:
+            # Reranked order isn't explained by retrieval scores, so only max_k/budget apply
+            final_results, selection = adaptive_k.select(final_results, cut=not rerank)
+            span.update(k=selection.k, cut=selection.reason, tokens=selection.tokens,
+                        semantic_cut=selection.semantic_cut, keyword_cut=selection.keyword_cut)
+        telemetry.registry.inc("sourceiq_retrieval_selections_total", cut=selection.reason)
+        telemetry.registry.inc("sourceiq_retrieval_selected_chunks_total", selection.k)
+
+    if filters.workspace:
+        # Show repo-relative paths (prompt citations, GitHub links), not the job folder
+        root = f"{filters.workspace}/"
+        final_results = [replace(c, filename=c.filename[len(root):]) if c.filename.startswith(root) else c for c in final_results]
     
-    # Add Semantic Results First (High priority)
-    for res in semantic_results:
-        filename, text, score, source = res
-        if text not in seen_texts:
-            final_results.append(res)
-            seen_texts.add(text)
-            
-    # Add Keyword Results (Only if new)
-    for res in keyword_results:
-        filename, text, score, source = res
-        if text not in seen_texts:
-            final_results.append(res)
-            seen_texts.add(text)
-    
-    # Format for LLM
+    return final_results
+
+# --- MULTI-QUERY RETRIEVAL ---
+_search_pool = ThreadPoolExecutor(max_workers=config.DB_POOL_MAX, thread_name_prefix="multi-query")
+
+def _fuse(ranked_lists, limit, k=60):
+    """
+    Reciprocal rank fusion: rows found by several variants/strategies rise to the top.
+    """
+    scores = {}
+    chunks = {}
+    for results in ranked_lists:
+        for rank, chunk in enumerate(results):
+            scores[chunk.key] = scores.get(chunk.key, 0.0) + 1.0 / (k + rank + 1)
+            # Keep the copy with the best raw score (semantic beats the fixed keyword 0.9 only if higher)
+            if chunk.key not in chunks or chunk.score > chunks[chunk.key].score:
+                chunks[chunk.key] = chunk
+    ranked_keys = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [chunks[key] for key in ranked_keys[:limit]]
+
+def retrieve_multi_query(query, filters, semantic_limit, keyword_limit, chat_history=None):
+    """
+    Searches the raw question, its identifiers and a history-aware rewrite concurrently.
+    All variants are embedded in one batch. The raw question runs on the caller's
+    thread (never queued behind other sessions' variants); the extra variants run on
+    the shared pool and are cancelled or dropped once config.MULTI_QUERY_BUDGET_MS
+    has passed.
+    """
+    variants = build_query_variants(query, chat_history)
+    with telemetry.span("retrieve.embed", variants=len(variants)):
+        vectors = embedder.encode([text for _, text in variants]).tolist()
+
+    deadline = time.perf_counter() + config.MULTI_QUERY_BUDGET_MS / 1000
+    futures = {
+        # copy_context() keeps the worker's spans in the caller's trace
+        _search_pool.submit(
+            contextvars.copy_context().run, _search_with_fallback, text, vector, filters, semantic_limit, keyword_limit
+        ): name
+        for (name, text), vector in zip(variants, vectors)
+        if name != "raw"
+    }
+
+    results = {}
+    with telemetry.span("retrieve.multi_query_sql", variants=len(variants)) as span:
+        # The raw question must succeed; extra variants are best-effort
+        results["raw"] = _search_with_fallback(query, vectors[0], filters, semantic_limit, keyword_limit)
+
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Query variant '{futures[future]}' failed: {e}")
+        for future in pending:
+            # Queued variants never start; running ones finish on their own but are ignored
+            future.cancel()
+        span["completed"] = len(results)
+        span["dropped"] = len(pending)
+
+    with telemetry.span("retrieve.merge"):
+        ranked_lists = []
+        for name, _ in variants:
+            if name in results:
+                ranked_lists.extend(results[name])
+        return _fuse(ranked_lists, semantic_limit + keyword_limit)
+
+def format_context(chunks):
+    """
+    Renders retrieved chunks into the CONTEXT section of the prompt.
+    """
     context_str = ""
-    for filename, text, score, source in final_results:
-        context_str += f"\n--- FILE: {filename} (Match: {source}) ---\n{text}\n"
-    
+    for chunk in chunks:
+        span = f" {chunk.line_span}" if chunk.line_span else ""
+        context_str += f"\n--- FILE: {chunk.filename}{span} (Match: {chunk.source}) ---\n{chunk.text}\n"
     return context_str
 
+@telemetry.traced("summary.total")
 def generate_summary(readme_text, file_structure_text):
     """
     Generates a structured overview of the repository using the LLM.
@@ -136,7 +411,9 @@ def generate_summary(readme_text, file_structure_text):
     
     @retry_with_backoff
     def run_llm():
-        response = model.generate_content(prompt)
+        with telemetry.span("summary.llm") as span:
+            response = model.generate_content(prompt)
+            telemetry.record_llm_usage(span, response)
         return response.text
 
     try:
@@ -144,20 +421,36 @@ def generate_summary(readme_text, file_structure_text):
     except Exception as e:
         return f"Could not generate summary (Quota Exceeded): {e}"
 
-def generate_answer(query, chat_history=[]):
-    context = retrieve_context(query)
+def summarize_history(previous_summary, messages, max_tokens):
+    """
+    Folds older chat turns into the rolling conversation summary using the LLM.
+    """
+    turns = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content'][:2000]}" for m in messages
+    )
+    prompt = f"""
+    Update the running summary of a conversation about a code repository.
+    Keep file names, function/class names and decisions; drop code blocks and pleasantries.
+    Reply with the updated summary only, at most {max_tokens * 3} characters.
     
-    if not context.strip():
-        return "I couldn't find any relevant code in the repository. Try rephrasing or checking if the code is indexed.", ""
+    CURRENT SUMMARY:
+    {previous_summary or "(empty)"}
+    
+    NEW TURNS:
+    {turns}
+    """
 
-    # Format history for the prompt
-    history_str = ""
-    if chat_history:
-        history_str = "\nPREVIOUS CONVERSATION:\n"
-        for msg in chat_history[-6:]: # Keep last 3 turns (User + AI)
-            role = "User" if msg["role"] == "user" else "Assistant"
-            history_str += f"{role}: {msg['content']}\n"
+    # Single attempt, no retry: a failure simply falls back to the extractive
+    # summary (see ConversationMemory.update)
+    def run_llm():
+        with telemetry.span("memory.summarize_llm") as span:
+            response = model.generate_content(prompt)
+            telemetry.record_llm_usage(span, response)
+        return response.text
+
+    return run_llm()
 
+def build_answer_prompt(query, context, history_str):
     prompt = f"""
     You are a concise assistant for answering questions about the currently loaded GitHub repository.
     Always ground answers in repository content.
@@ -183,13 +476,113 @@ def generate_answer(query, chat_history=[]):
     3. Keep responses short and actionable.
     4. If the context is empty or irrelevant, say "I don't know based on the current code."
     """
-    
+    return prompt
+
+def _run_answer_llm(prompt, chunks):
     @retry_with_backoff
     def run_llm():
-        response = model.generate_content(prompt)
-        return response.text, context
+        with telemetry.span("answer.llm", prompt_chars=len(prompt)) as span:
+            response = model.generate_content(prompt)
+            telemetry.record_llm_usage(span, response)
+        return response.text, chunks
 
     try:
         return run_llm()
     except Exception as e:
-        return f"Error connecting to Gemini (Quota Exceeded): {e}", context
\ No newline at end of file
+        return f"Error connecting to Gemini (Quota Exceeded): {e}", chunks
+
+def _render_history(chat_history, memory):
+    # Format history for the prompt: recent turns within a token budget + rolling summary.
+    # Pass a per-session 'memory' so the summary is built incrementally across turns.
+    # Never calls the LLM: the summary is brought up to date by fold_history afterwards.
+    if memory is None:
+        memory = ConversationMemory()
+    with telemetry.span("answer.history"):
+        return memory.render(chat_history)
+
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+def fold_history(chat_history, memory):
+    """
+    Folds turns that left the verbatim window into the session's rolling summary with
+    the LLM, in the background, once the answer is out. Until it finishes, prompts use
+    the extractive summary of those turns. Returns a Future (or None without memory).
+    """
+    if memory is None or not chat_history:
+        return None
+
+    def run():
+        with telemetry.span("memory.fold"):
+            memory.update(chat_history, summarizer=summarize_history)
+
+    return _summary_pool.submit(run)
+
+@telemetry.traced("answer.total")
+def generate_answer(query, chat_history=[], memory=None, filters=None, context_chunks=None):
+    """
+    Answers 'query'. Pass 'context_chunks' to reuse already-retrieved chunks
+    (e.g. for follow-ups) instead of running retrieval again.
+    """
+    if context_chunks is not None:
+        chunks = context_chunks
+    else:
+        chunks = retrieve_context(query, filters=filters, chat_history=chat_history)
+    
+    if not chunks:
+        return "I couldn't find any relevant code in the repository. Try rephrasing or checking if the code is indexed.", []
+    context = format_context(chunks)
+    history_str = _render_history(chat_history, memory)
+
+    prompt = build_answer_prompt(query, context, history_str)
+    return _run_answer_llm(prompt, chunks)
+
+# --- FOLLOW-UP ACTIONS ---
+# Follow-ups refer to a specific answer, so they reuse that turn's chunks rather than
+# re-running retrieval on a generic question.
+FOLLOW_UP_ACTIONS = {
+    "Explain Concepts": "Explain the core concepts and logic in the code above.",
+    "Generate Test": "Write a unit test for the code discussed above.",
+    "Security Check": "Are there any security vulnerabilities or bad practices here?"
+}
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="followup-prefetch")
+
+def prepare_followups(chunks, chat_history, memory=None):
+    """
+    Builds the full prompt for every follow-up action of the turn that produced 'chunks'.
+    'chat_history' should end with that turn's answer.
+    """
+    if not chunks:
+        return {}
+    with telemetry.span("followup.prepare", actions=len(FOLLOW_UP_ACTIONS)):
+        context = format_context(chunks)
+        prepared = {}
+        for action, query in FOLLOW_UP_ACTIONS.items():
+            # Each prompt is built as if the follow-up question were already in the history
+            history = chat_history + [{"role": "user", "content": query}]
+            prepared[action] = build_answer_prompt(query, context, _render_history(history, memory))
+        return prepared
+
+def prefetch_followups(chunks, chat_history, memory=None):
+    """
+    Speculatively prepares follow-up prompts in the background while the user reads
+    the answer. Returns a Future resolving to {action: prompt}.
+    The history and memory are snapshotted here, on the caller's thread, so the
+    background work never sees (or changes) the session's later state.
+    """
+    return _prefetch_pool.submit(prepare_followups, chunks, list(chat_history), memory and memory.copy())
+
+@telemetry.traced("followup.total")
+def generate_followup(action, chunks, chat_history=[], memory=None, prepared=None, filters=None):
+    """
+    Runs a follow-up action against the referenced turn's chunks. Uses the prefetched
+    prompt when available, otherwise builds it now (still without re-retrieving).
+    """
+    query = FOLLOW_UP_ACTIONS[action]
+    if not chunks:
+        return generate_answer(query, chat_history, memory=memory, filters=filters)
+    if prepared and action in prepared:
+        prompt = prepared[action]
+    else:
+        prompt = build_answer_prompt(query, format_context(chunks), _render_history(chat_history, memory))
+    return _run_answer_llm(prompt, chunks)
@@ -0,0 +1,87 @@
+import time
+import threading
+import config
+import telemetry
+
+# --- CROSS-ENCODER RERANKER ---
+# Loaded in a background thread (warm_up), never inside a request: loading, or
+# downloading on first use, takes seconds and would blow the rerank budget.
+_model = None
+_load_error = None
+_loader = None
+_loader_lock = threading.Lock()
+
+def _load():
+    global _model, _load_error
+    try:
+        from sentence_transformers import CrossEncoder
+        _model = CrossEncoder(config.RERANK_MODEL, device="cpu", max_length=512)
+    except Exception as e:
+        _load_error = e
+        print(f"⚠️ Reranker model failed to load: {e}")
+
+def warm_up():
+    """
+    Starts loading the model in a daemon thread (once per process).
+    """
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = threading.Thread(target=_load, name="reranker-warm-up", daemon=True)
+            _loader.start()
+
+def get_model():
+    """
+    The loaded model, or None while it is still loading (or failed to load).
+    """
+    warm_up()
+    return _model
+
+def fallback_selection(chunks):
+    """
+    The selection retrieval makes without a reranker: the first SEMANTIC_LIMIT semantic
+    and KEYWORD_LIMIT keyword chunks of the fused pool, in fused order.
+    """
+    limits = {"semantic": config.SEMANTIC_LIMIT, "keyword": config.KEYWORD_LIMIT}
+    kept = []
+    for chunk in chunks:
+        if limits.get(chunk.source, 0) > 0:
+            limits[chunk.source] -= 1
+            kept.append(chunk)
+    return kept
+
+def rerank(query, chunks, top_k=None, budget_ms=None, batch_size=None):
+    """
+    Re-orders 'chunks' (already in fused order) by cross-encoder relevance and keeps 'top_k'.
+
+    Scoring runs in batches against a wall-clock budget. If the budget runs out before
+    every candidate is scored (or the model isn't loaded), the normal hybrid selection is
+    returned instead (see fallback_selection), so a slow CPU never delays the answer by
+    more than roughly one batch, and a semantic-heavy pool doesn't crowd out keyword hits.
+    """
+    top_k = top_k or config.RERANK_TOP_K
+    budget_ms = config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    batch_size = batch_size or config.RERANK_BATCH_SIZE
+
+    if len(chunks) <= 1:
+        return chunks[:top_k]
+
+    with telemetry.span("retrieve.rerank", candidates=len(chunks)) as span:
+        deadline = time.perf_counter() + budget_ms / 1000
+        model = get_model()
+        if model is None:
+            span["fallback"] = "model_unavailable" if _load_error else "model_loading"
+            return fallback_selection(chunks)
+
+        scores = []
+        for i in range(0, len(chunks), batch_size):
+            if time.perf_counter() > deadline:
+                span["fallback"] = "budget_exceeded"
+                return fallback_selection(chunks)
+            batch = chunks[i:i + batch_size]
+            scores.extend(model.predict([(query, c.text) for c in batch], batch_size=batch_size))
+
+        ranked = sorted(zip(scores, range(len(chunks))), key=lambda p: p[0], reverse=True)
+        span["kept"] = min(top_k, len(ranked))
+        # Keep the original retrieval score on the chunk; the order carries the rerank result
+        return [chunks[i] for _, i in ranked[:top_k]]
@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+import config
+
+# --- METADATA FILTERS ---
+# Pushed down into both retrieval queries as extra WHERE conditions on the
+# 'language', 'file_type', 'is_test' and 'filename' columns written by ingest.py.
+
+# Only what the indexer actually picks up can be filtered on
+INDEXED_FILE_TYPES = [pattern.lstrip("*") for pattern in config.INCLUDED_PATTERNS]
+INDEXED_LANGUAGES = sorted({config.LANGUAGE_BY_EXTENSION[ext] for ext in INDEXED_FILE_TYPES if ext in config.LANGUAGE_BY_EXTENSION})
+
+# Query words that imply a language / area of the codebase
+LANGUAGE_HINTS = {
+    "python": ["python"],
+    "javascript": ["javascript"],
+    "js": ["javascript"],
+    "typescript": ["typescript"],
+    "java": ["java"],
+    "markdown": ["markdown"],
+    # Areas of the codebase: these also count on their own ("the docs", "our frontend")
+    "docs": ["markdown"],
+    "documentation": ["markdown"],
+    "readme": ["markdown"],
+    "frontend": ["javascript", "typescript"],
+    "front-end": ["javascript", "typescript"],
+}
+AREA_HINTS = ["docs", "documentation", "readme", "frontend", "front-end"]
+# A language only counts when the question points *at* that kind of code ("python code",
+# "js files"), not "is this written in python?" or "what python version is required?"
+LANGUAGE_PATTERN = re.compile(
+    r"\b([\w-]+)\s+(?:code|files?|modules?|functions?|classes|scripts?|side|parts?|components?)\b"
+)
+AREA_PATTERN = re.compile(r"\b(?:the|our|its)\s+(" + "|".join(re.escape(w) for w in AREA_HINTS) + r")\b")
+# Only phrases that point *at* the tests ("where are the tests"), not "write a test for X"
+TEST_PATTERN = re.compile(
+    r"\b(?:the|our|existing|in|which|what)\s+(?:unit\s+)?tests\b|\btest\s+(?:files?|suites?|folders?|directory)\b"
+)
+
+# Paths like "src/api/" or "pages/chat.py" mentioned in the question. A bare "a/b"
+# ("input/output", "client/server") is prose, not a path (see _looks_like_path).
+PATH_PATTERN = re.compile(r"(?<![\w/])((?:[\w.-]+/)+[\w.-]*)")
+FILE_EXTENSION_PATTERN = re.compile(r"\.\w{1,5}$")
+
+
+@dataclass
+class SearchFilters:
+    languages: List[str] = field(default_factory=list)
+    path_prefixes: List[str] = field(default_factory=list)
+    file_types: List[str] = field(default_factory=list)  # Extensions, e.g. ".py"
+    tests_only: bool = False
+    workspace: str = ""  # Job workspace folder; always applied, scopes the search to one repository
+    inferred: bool = False  # True when derived from the question rather than set by the UI
+
+    def is_empty(self):
+        # The workspace only scopes the search; it doesn't count as a user filter
+        return not (self.languages or self.path_prefixes or self.file_types or self.tests_only)
+
+    def describe(self):
+        parts = []
+        if self.languages:
+            parts.append("lang: " + ", ".join(self.languages))
+        if self.path_prefixes:
+            parts.append("path: " + ", ".join(self.path_prefixes))
+        if self.file_types:
+            parts.append("type: " + ", ".join(self.file_types))
+        if self.tests_only:
+            parts.append("tests only")
+        return "; ".join(parts)
+
+    def filename_sql(self):
+        """
+        Only the workspace/path-prefix conditions, as (sql, params). They use nothing but
+        'filename', so they also apply to code_symbols.
+        """
+        conditions = []
+        params = []
+        root = f"{self.workspace}/" if self.workspace else ""
+        if root:
+            conditions.append("filename LIKE %s")
+            params.append(_escape_like(root) + "%")
+        if self.path_prefixes:
+            conditions.append("(" + " OR ".join(["filename LIKE %s"] * len(self.path_prefixes)) + ")")
+            params.extend(_escape_like(root + (p[2:] if p.startswith("./") else p)) + "%" for p in self.path_prefixes)
+        if not conditions:
+            return "TRUE", []
+        return " AND ".join(conditions), params
+
+    def to_sql(self):
+        """
+        Returns (sql, params) to AND into a WHERE clause; ("TRUE", []) when empty.
+        Path prefixes use LIKE 'prefix%' so the text_pattern_ops index applies.
+        """
+        conditions = []
+        params = []
+        if self.languages:
+            conditions.append("language = ANY(%s)")
+            params.append(list(self.languages))
+        if self.file_types:
+            conditions.append("file_type = ANY(%s)")
+            params.append([t.lower() if t.startswith(".") else f".{t.lower()}" for t in self.file_types])
+        if self.tests_only:
+            conditions.append("is_test")
+        filename_sql, filename_params = self.filename_sql()
+        if filename_sql != "TRUE":
+            conditions.append(filename_sql)
+            params.extend(filename_params)
+        if not conditions:
+            return "TRUE", []
+        return " AND ".join(conditions), params
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _looks_like_path(token):
+    # "./x", "src/api/", "src/api/routes" or "pages/chat.py"
+    return (
+        token.startswith("./")
+        or token.endswith("/")
+        or token.count("/") >= 2
+        or bool(FILE_EXTENSION_PATTERN.search(token))
+    )
+
+
+def infer_filters(query, workspace=""):
+    """
+    Derives filters from the wording of the question ("the frontend", "the tests",
+    "in src/api/"). Returns an empty SearchFilters if nothing is implied.
+    """
+    filters = SearchFilters(workspace=workspace, inferred=True)
+
+    lowered = query.lower()
+    words = set(LANGUAGE_PATTERN.findall(lowered)) | set(AREA_PATTERN.findall(lowered))
+    for word in sorted(words):
+        for lang in LANGUAGE_HINTS.get(word, []):
+            if lang in INDEXED_LANGUAGES and lang not in filters.languages:
+                filters.languages.append(lang)
+
+    if TEST_PATTERN.search(lowered):
+        filters.tests_only = True
+
+    for path in PATH_PATTERN.findall(re.sub(r"https?://\S+", " ", query)):
+        path = path.rstrip(".")
+        if _looks_like_path(path) and path not in filters.path_prefixes:
+            filters.path_prefixes.append(path)
+
+    return filters
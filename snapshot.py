@@ -0,0 +1,335 @@
+"""
+Index snapshots: export a repository's code_vectors rows at a given commit and
+bulk-load them again later without re-embedding.
+
+    python snapshot.py export --workspace job-12 --repo https://github.com/netflix/conductor
+    python snapshot.py import --workspace job-13 --repo https://github.com/netflix/conductor --commit <sha>
+    python snapshot.py list
+
+A snapshot is a folder of flat, memory-mappable columns under
+SNAPSHOT_DIR/<repo>/<commit>/:
+
+    manifest.json           repo, commit, rows, embedding model and dimension
+    embedding.npy           float32 [rows, dim], contiguous
+    <column>.bin            UTF-8 values of a text column, concatenated
+    <column>.offsets.npy    int64 [rows + 1] byte offsets into <column>.bin
+    is_test.npy             bool [rows]
+
+Paths are stored relative to the repository root (without the job workspace folder),
+so a snapshot can be imported into any workspace.
+"""
+import io
+import os
+import re
+import csv
+import json
+import shutil
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import psycopg2
+
+import config
+import code_tokens
+
+SNAPSHOT_FORMAT = 1
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # Must match ingest.py
+IMPORT_BATCH = 5000
+
+TEXT_COLUMNS = ["filename", "location", "language", "directory", "file_type", "start_pos", "end_pos", "text"]
+JSON_COLUMNS = {"start_pos", "end_pos"}  # Stored as JSON text; "" means NULL
+
+
+# --- LOCATION ---
+def repo_key(repo):
+    """
+    Folder-safe name for a repository URL: https://github.com/a/b.git -> github.com_a_b
+    """
+    name = repo.split("://")[-1].rstrip("/")
+    if name.endswith(".git"):
+        name = name[:-4]
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+
+def snapshot_path(repo, commit, root=None):
+    return os.path.join(root or config.SNAPSHOT_DIR, repo_key(repo), commit)
+
+def has_snapshot(repo, commit):
+    return os.path.exists(os.path.join(snapshot_path(repo, commit), "manifest.json"))
+
+def head_commit(repo_dir):
+    return subprocess.check_output(["git", "-C", repo_dir, "rev-parse", "HEAD"], text=True).strip()
+
+
+# --- COLUMN FILES ---
+class TextColumnWriter:
+    """
+    Streams a text column to disk: values go straight to <name>.bin, and their
+    offsets to a pre-sized, memory-mapped <name>.offsets.npy.
+    """
+
+    def __init__(self, folder, name, rows):
+        self.file = open(os.path.join(folder, f"{name}.bin"), "wb")
+        self.offsets = np.lib.format.open_memmap(
+            os.path.join(folder, f"{name}.offsets.npy"), mode="w+", dtype=np.int64, shape=(rows + 1,)
+        )
+        self.offsets[0] = 0
+        self.count = 0
+
+    def append(self, value):
+        data = value.encode("utf-8")
+        self.file.write(data)
+        self.offsets[self.count + 1] = self.offsets[self.count] + len(data)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+        self.offsets.flush()
+        del self.offsets
+
+class TextColumn:
+    """
+    Read-only view of a text column; values are decoded on access from the mapped file.
+    """
+
+    def __init__(self, folder, name):
+        self.offsets = np.load(os.path.join(folder, f"{name}.offsets.npy"), mmap_mode="r")
+        path = os.path.join(folder, f"{name}.bin")
+        # np.memmap can't map an empty file
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+def open_snapshot(folder):
+    """
+    Maps a snapshot. Returns (manifest, {column: TextColumn | array}, embeddings).
+    """
+    with open(os.path.join(folder, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {folder}")
+    columns = {name: TextColumn(folder, name) for name in TEXT_COLUMNS}
+    columns["is_test"] = np.load(os.path.join(folder, "is_test.npy"), mmap_mode="r")
+    embeddings = np.load(os.path.join(folder, "embedding.npy"), mmap_mode="r")
+    return manifest, columns, embeddings
+
+
+# --- EXPORT ---
+def _strip_workspace(path, workspace):
+    if path == workspace:
+        return ""
+    return path[len(workspace) + 1:] if path.startswith(f"{workspace}/") else path
+
+def export_snapshot(workspace, repo, commit, root=None):
+    """
+    Writes the workspace's rows of code_vectors as a snapshot for (repo, commit).
+    Rows are streamed into pre-sized column files, so memory stays flat however large
+    the repository is. The folder is written next to its final location and renamed
+    into place, so readers never see a half-written snapshot. Returns (path, rows).
+    """
+    final_path = snapshot_path(repo, commit, root)
+    temp_path = f"{final_path}.tmp-{os.getpid()}"
+
+    conn = psycopg2.connect(config.get_db_url())
+    # One snapshot of the table for the count and the scan, while the indexer keeps writing
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT count(*), max(vector_dims(embedding)) FROM code_vectors WHERE filename LIKE %s",
+                (f"{workspace}/%",),
+            )
+            rows, dim = cur.fetchone()
+        if not rows:
+            raise ValueError(f"No indexed rows for workspace '{workspace}'")
+
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(temp_path, "embedding.npy"), mode="w+", dtype=np.float32, shape=(rows, dim)
+        )
+        is_test = np.lib.format.open_memmap(
+            os.path.join(temp_path, "is_test.npy"), mode="w+", dtype=bool, shape=(rows,)
+        )
+        writers = {name: TextColumnWriter(temp_path, name, rows) for name in TEXT_COLUMNS}
+
+        # Server-side cursor: rows are streamed instead of loaded at once
+        with conn.cursor(name="snapshot_export") as cur:
+            cur.itersize = 2000
+            cur.execute("""
+                SELECT filename, location::text, language, directory, file_type,
+                       start_pos::text, end_pos::text, text, is_test, embedding::text
+                FROM code_vectors
+                WHERE filename LIKE %s
+                ORDER BY filename, location
+            """, (f"{workspace}/%",))
+            for i, row in enumerate(cur):
+                filename, location, language, directory, file_type, start_pos, end_pos, text, test, embedding = row
+                writers["filename"].append(_strip_workspace(filename, workspace))
+                writers["location"].append(location)
+                writers["language"].append(language or "")
+                writers["directory"].append(_strip_workspace(directory or "", workspace))
+                writers["file_type"].append(file_type or "")
+                writers["start_pos"].append(start_pos or "")
+                writers["end_pos"].append(end_pos or "")
+                writers["text"].append(text)
+                is_test[i] = bool(test)
+                embeddings[i] = np.fromstring(embedding.strip("[]"), dtype=np.float32, sep=",")
+
+        for writer in writers.values():
+            writer.close()
+        embeddings.flush()
+        is_test.flush()
+        del embeddings, is_test
+    except Exception:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "repo": repo,
+        "commit": commit,
+        "rows": rows,
+        "dim": int(dim),
+        "model": EMBEDDING_MODEL,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(temp_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final_path, ignore_errors=True)
+    os.replace(temp_path, final_path)
+    return final_path, rows
+
+
+# --- IMPORT ---
+def _copy_rows(cur, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def import_snapshot(repo, commit, workspace, root=None, on_batch=None):
+    """
+    Bulk-loads a snapshot into code_vectors (and code_symbols) under 'workspace',
+    without re-embedding. Rows that already exist are left alone. Returns the number
+    of chunks inserted. 'on_batch(done, total)' is called after every staged batch
+    (e.g. a job heartbeat); an exception from it aborts the import.
+    """
+    manifest, columns, embeddings = open_snapshot(snapshot_path(repo, commit, root))
+    if manifest["model"] != EMBEDDING_MODEL:
+        raise ValueError(f"Snapshot was embedded with {manifest['model']}, index uses {EMBEDDING_MODEL}")
+
+    vector_columns = ["filename", "location", "language", "directory", "file_type",
+                      "is_test", "start_pos", "end_pos", "text", "embedding"]
+    conn = psycopg2.connect(config.get_db_url())
+    try:
+        with conn.cursor() as cur:
+            # Stage through temp tables so the COPY never conflicts with the live indexer
+            cur.execute("CREATE TEMP TABLE snapshot_vectors (LIKE code_vectors INCLUDING DEFAULTS) ON COMMIT DROP")
+            cur.execute("SELECT to_regclass('code_symbols') IS NOT NULL")
+            with_symbols = cur.fetchone()[0]
+            if with_symbols:
+                cur.execute("CREATE TEMP TABLE snapshot_symbols (LIKE code_symbols INCLUDING DEFAULTS) ON COMMIT DROP")
+
+            for start in range(0, manifest["rows"], IMPORT_BATCH):
+                end = min(start + IMPORT_BATCH, manifest["rows"])
+                # pgvector's text form, formatted by numpy for the whole batch
+                # ('%.9g' round-trips float32 exactly)
+                buffer = io.StringIO()
+                np.savetxt(buffer, embeddings[start:end], fmt="%.9g", delimiter=",", newline="]\n[")
+                vectors = ("[" + buffer.getvalue()[:-1]).splitlines()
+                vector_rows, symbol_rows = [], []
+                for i in range(start, end):
+                    filename = f"{workspace}/{columns['filename'][i]}"
+                    directory = columns["directory"][i]
+                    location = columns["location"][i]
+                    text = columns["text"][i]
+                    vector_rows.append([
+                        filename,
+                        location,
+                        columns["language"][i],
+                        f"{workspace}/{directory}" if directory else workspace,
+                        columns["file_type"][i],
+                        "true" if columns["is_test"][i] else "false",
+                        columns["start_pos"][i] or None,
+                        columns["end_pos"][i] or None,
+                        text,
+                        vectors[i - start],
+                    ])
+                    if with_symbols:
+                        # Symbols are cheap to recompute; only the embeddings are worth shipping
+                        symbol_rows.extend([filename, location, s.symbol, s.kind] for s in code_tokens.extract_symbols(text))
+                _copy_rows(cur, "snapshot_vectors", vector_columns, vector_rows)
+                if symbol_rows:
+                    _copy_rows(cur, "snapshot_symbols", ["filename", "location", "symbol", "kind"], symbol_rows)
+                if on_batch:
+                    on_batch(end, manifest["rows"])
+
+            cols = ", ".join(vector_columns)
+            cur.execute(f"INSERT INTO code_vectors ({cols}) SELECT {cols} FROM snapshot_vectors ON CONFLICT DO NOTHING")
+            inserted = cur.rowcount
+            if with_symbols:
+                cur.execute(
+                    "INSERT INTO code_symbols (filename, location, symbol, kind) "
+                    "SELECT filename, location, symbol, kind FROM snapshot_symbols ON CONFLICT DO NOTHING"
+                )
+        conn.commit()
+        return inserted
+    finally:
+        conn.close()
+
+
+# --- CLI ---
+def list_snapshots(root=None):
+    root = root or config.SNAPSHOT_DIR
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for repo in sorted(os.listdir(root)):
+        for commit in sorted(os.listdir(os.path.join(root, repo))):
+            manifest_path = os.path.join(root, repo, commit, "manifest.json")
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    found.append(json.load(f))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import index snapshots keyed by repository commit.")
+    parser.add_argument("--dir", default=config.SNAPSHOT_DIR, help="Snapshot root folder")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = commands.add_parser("export", help="Write a workspace's indexed rows to a snapshot")
+    export_cmd.add_argument("--workspace", required=True, help="Folder under WATCH_DIR (e.g. job-12)")
+    export_cmd.add_argument("--repo", required=True, help="Repository URL the workspace was cloned from")
+    export_cmd.add_argument("--commit", help="Defaults to the workspace's git HEAD")
+
+    import_cmd = commands.add_parser("import", help="Load a snapshot into a workspace without re-embedding")
+    import_cmd.add_argument("--workspace", required=True)
+    import_cmd.add_argument("--repo", required=True)
+    import_cmd.add_argument("--commit", required=True)
+
+    commands.add_parser("list", help="Show available snapshots")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        commit = args.commit or head_commit(os.path.join(config.WATCH_DIR, args.workspace))
+        path, rows = export_snapshot(args.workspace, args.repo, commit, root=args.dir)
+        print(f"📦 Exported {rows} chunks to {path}")
+    elif args.command == "import":
+        rows = import_snapshot(args.repo, args.commit, args.workspace, root=args.dir)
+        print(f"📥 Imported {rows} chunks into {args.workspace}")
+    else:
+        for manifest in list_snapshots(args.dir):
+            print(f"{manifest['repo']} @ {manifest['commit'][:12]}  {manifest['rows']} chunks  ({manifest['created_at']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import uuid
+import functools
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURATION ---
+# SOURCEIQ_METRICS_PORT: serve Prometheus metrics on this port (unset = disabled)
+# SOURCEIQ_TRACE_LOG: "1" to emit one JSON log line per span
+# SOURCEIQ_EXPLAIN_SLOW_MS: capture EXPLAIN ANALYZE for queries slower than this (unset = disabled)
+METRICS_PORT = os.environ.get("SOURCEIQ_METRICS_PORT", "")
+TRACE_LOG = os.environ.get("SOURCEIQ_TRACE_LOG", "0") == "1"
+EXPLAIN_SLOW_MS = float(os.environ.get("SOURCEIQ_EXPLAIN_SLOW_MS", "0") or 0)
+
+# Latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("sourceiq.trace")
+if TRACE_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Current trace id, so all spans of one request share it (threads/sessions don't mix)
+_trace_id = contextvars.ContextVar("sourceiq_trace_id", default=None)
+
+
+# --- METRIC REGISTRY ---
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # stage -> {"count", "sum", "buckets": [...]}
+        self.counters = {}    # (name, labels tuple) -> value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = {"count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)}
+                self.histograms[stage] = hist
+            hist["count"] += 1
+            hist["sum"] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = [
+            "# HELP sourceiq_stage_seconds Latency of pipeline stages.",
+            "# TYPE sourceiq_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, hist in sorted(self.histograms.items()):
+                for bound, count in zip(BUCKETS, hist["buckets"]):
+                    lines.append(f'sourceiq_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'sourceiq_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'sourceiq_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+                lines.append(f'sourceiq_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+            seen_names = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in seen_names:
+                    lines.append(f"# TYPE {name} counter")
+                    seen_names.add(name)
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = _Registry()
+
+
+# --- SPANS ---
+@contextmanager
+def trace():
+    """
+    Starts a new trace (one per user request); nested spans share its id.
+    """
+    token = _trace_id.set(uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Times a pipeline stage. Attributes can be added inside the block through the
+    yielded dict, e.g. s["tokens_in"] = 123 (token counts become counters).
+    """
+    attrs = dict(attrs)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(stage, elapsed)
+        for kind in ("tokens_in", "tokens_out"):
+            if attrs.get(kind):
+                registry.inc("sourceiq_llm_tokens_total", attrs[kind], stage=stage, kind=kind.split("_")[1])
+        if error:
+            registry.inc("sourceiq_stage_errors_total", stage=stage, error=error)
+        if TRACE_LOG:
+            record = {"trace_id": _trace_id.get(), "stage": stage, "ms": round(elapsed * 1000, 2)}
+            if error:
+                record["error"] = error
+            record.update(attrs)
+            logger.info(json.dumps(record, default=str))
+
+def traced(stage):
+    """
+    Decorator: runs the function inside a span, starting a new trace if none is active.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace_id.get() is None:
+                with trace(), span(stage):
+                    return func(*args, **kwargs)
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_llm_usage(attrs, response):
+    """
+    Copies Gemini token usage (if reported) into span attributes.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        attrs["tokens_in"] = getattr(usage, "prompt_token_count", 0) or 0
+        attrs["tokens_out"] = getattr(usage, "candidates_token_count", 0) or 0
+
+
+# --- SQL HELPERS ---
+def timed_query(cur, stage, sql, params=None):
+    """
+    Executes 'sql' inside a span. With SOURCEIQ_EXPLAIN_SLOW_MS set, slow queries are
+    re-run under EXPLAIN ANALYZE and the plan is logged.
+    """
+    with span(stage) as attrs:
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        attrs["rows"] = len(rows)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if EXPLAIN_SLOW_MS and elapsed_ms > EXPLAIN_SLOW_MS:
+        try:
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+            registry.inc("sourceiq_slow_queries_total", stage=stage)
+            logger.warning(json.dumps({"trace_id": _trace_id.get(), "stage": stage, "ms": round(elapsed_ms, 2), "explain": plan}))
+        except Exception as e:
+            print(f"⚠️ EXPLAIN ANALYZE failed for {stage}: {e}")
+    return rows
+
+
+# --- METRICS ENDPOINT ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+_server_lock = threading.Lock()
+_server = None
+
+def start_metrics_server(port=None):
+    """
+    Serves /metrics from a daemon thread. Safe to call repeatedly (Streamlit reruns);
+    only the first call per process binds the port.
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Metrics endpoint not started on :{port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            print(f"📈 Metrics available at http://0.0.0.0:{port}/metrics")
+    return _server
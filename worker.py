@@ -0,0 +1,270 @@
+"""
+Background workers for clone/extract + indexing jobs (see jobs.py).
+
+    python worker.py --workers 2
+
+Each worker process claims queued jobs, acquires the source into the job's workspace
+under WATCH_DIR (which the live indexer watches), waits until its chunks are indexed,
+and reports progress/cancellation through the jobs table.
+"""
+import os
+import re
+import time
+import shutil
+import fnmatch
+import socket
+import zipfile
+import argparse
+import subprocess
+import multiprocessing
+from git import Repo
+
+import config
+import jobs
+import chat_store
+import snapshot
+import telemetry
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _check_cancel(job_id):
+    # Doubles as the job's heartbeat (see jobs.recover_stale_jobs)
+    if jobs.heartbeat(job_id):
+        raise JobCancelled()
+
+
+def _beater(job_id):
+    """
+    Heartbeat for long loops: call it as often as convenient, it only reaches the
+    database (and checks for a cancel) every few seconds.
+    """
+    last = [time.time()]
+    def beat(*_):
+        if time.time() - last[0] >= config.JOB_POLL_SECONDS * 5:
+            _check_cancel(job_id)
+            last[0] = time.time()
+    return beat
+
+
+def _remove_dir(path, beat=None):
+    if os.path.exists(path):
+        def on_rm_error(func, path, exc_info):
+            os.chmod(path, 0o777)
+            func(path)
+        if beat is None:
+            shutil.rmtree(path, onerror=on_rm_error)
+            return
+        # Bottom-up, one folder at a time, so a huge tree can't starve the heartbeat
+        for root, _, _ in os.walk(path, topdown=False):
+            beat()
+            shutil.rmtree(root, onerror=on_rm_error)
+
+
+def clone_repo(job, target):
+    """
+    Runs 'git clone' as a subprocess so a cancel request can kill it mid-transfer.
+    """
+    # The URL is user input: only http(s), and '--' so it can never be read as an option
+    if not re.match(r"https?://", job["source"]):
+        raise RuntimeError("Only http(s) repository URLs are supported")
+    process = subprocess.Popen(
+        ["git", "clone", "--depth", "1", "--", job["source"], target],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    while process.poll() is None:
+        if jobs.heartbeat(job["id"]):
+            process.kill()
+            process.wait()
+            raise JobCancelled()
+        time.sleep(config.JOB_POLL_SECONDS)
+    if process.returncode != 0:
+        error = process.stderr.read().decode("utf-8", errors="ignore").strip()
+        raise RuntimeError(f"git clone failed: {error or process.returncode}")
+    return Repo(target).active_branch.name
+
+
+def extract_zip(job, target, beat):
+    os.makedirs(target, exist_ok=True)
+    with zipfile.ZipFile(job["source"], "r") as zip_ref:
+        # Member by member, so a large archive keeps the heartbeat going
+        for member in zip_ref.infolist():
+            beat()
+            zip_ref.extract(member, target)
+    # The upload was only needed to hand the file over to the worker
+    os.remove(job["source"])
+    return "main"
+
+
+def wait_for_index(job):
+    """
+    Polls code_vectors until the workspace has chunks and the count stops growing.
+    Returns (chunks, settled); settled is False if the timeout was hit first.
+    """
+    deadline = time.time() + config.JOB_INDEX_TIMEOUT_SECONDS
+    last_count, stable_polls = -1, 0
+    while time.time() < deadline:
+        _check_cancel(job["id"])
+        count = jobs.count_indexed_chunks(job["workspace"])
+        if count > 0 and count == last_count:
+            stable_polls += 1
+            if stable_polls >= 2:
+                return count, True
+        else:
+            stable_polls = 0
+        last_count = count
+        elapsed = config.JOB_INDEX_TIMEOUT_SECONDS - (deadline - time.time())
+        progress = 50 + int(45 * min(1.0, elapsed / config.JOB_INDEX_TIMEOUT_SECONDS))
+        jobs.update_job(job["id"], progress=progress, chunks=count, message=f"Indexing code vectors... ({count} chunks)")
+        time.sleep(config.JOB_POLL_SECONDS * 2)
+    return max(last_count, 0), False
+
+
+def _has_content(path):
+    # Empty or whitespace-only files produce no chunks, so they never show up in code_vectors
+    try:
+        with open(path, "rb") as f:
+            return bool(f.read().strip())
+    except OSError:
+        return False
+
+
+def count_source_files(target):
+    # Same selection as the indexer's LocalFile source (config.INCLUDED_PATTERNS),
+    # minus files the splitter turns into zero chunks
+    total = 0
+    for root, dirs, files in os.walk(target):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        total += sum(
+            1 for name in files
+            if any(fnmatch.fnmatch(name, p) for p in config.INCLUDED_PATTERNS) and _has_content(os.path.join(root, name))
+        )
+    return total
+
+
+def is_fully_indexed(job):
+    """
+    True when every indexable, non-empty file of the workspace has rows in code_vectors.
+    A stable row count alone can just mean the indexer paused.
+    """
+    on_disk = count_source_files(jobs.workspace_dir(job))
+    indexed = jobs.count_indexed_files(job["workspace"])
+    if indexed != on_disk:
+        print(f"⚠️ Job {job['id']}: {indexed}/{on_disk} files indexed, skipping snapshot export")
+        return False
+    return True
+
+
+def run_job(job):
+    try:
+        with telemetry.trace(), telemetry.span("job.total", kind=job["kind"]):
+            target = jobs.workspace_dir(job)
+            beat = _beater(job["id"])
+            jobs.update_job(job["id"], progress=10, message="Acquiring source...")
+            _remove_dir(target, beat)
+            with telemetry.span("ingest.clone" if job["kind"] == "github" else "ingest.extract_zip"):
+                if job["kind"] == "github":
+                    branch = clone_repo(job, target)
+                else:
+                    branch = extract_zip(job, target, beat)
+            _check_cancel(job["id"])
+
+            # Same repository at the same commit indexed before: load its snapshot instead of waiting
+            commit = snapshot.head_commit(target) if config.SNAPSHOTS_ENABLED and job["kind"] == "github" else None
+            if commit and snapshot.has_snapshot(job["source"], commit):
+                jobs.update_job(job["id"], status="indexing", progress=50, branch=branch, message="Loading index snapshot...")
+                try:
+                    with telemetry.span("ingest.snapshot_import"):
+                        snapshot.import_snapshot(job["source"], commit, job["workspace"], on_batch=beat)
+                    count = jobs.count_indexed_chunks(job["workspace"])
+                    jobs.update_job(job["id"], status="ready", progress=100, chunks=count, message="Repository Ready!")
+                    return
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Snapshot import failed for job {job['id']}, indexing from scratch: {e}")
+
+            jobs.update_job(job["id"], status="indexing", progress=50, branch=branch, message="Indexing code vectors...")
+            with telemetry.span("ingest.wait_first_vectors"):
+                count, settled = wait_for_index(job)
+
+            message = "Repository Ready!" if count else "Indexing is slow, but proceeding."
+            jobs.update_job(job["id"], status="ready", progress=100, chunks=count, message=message)
+
+            if commit and settled and is_fully_indexed(job):
+                # Only fully indexed workspaces make good snapshots: a partial one would
+                # become the permanent warm start for this commit
+                try:
+                    with telemetry.span("ingest.snapshot_export"):
+                        path, rows = snapshot.export_snapshot(job["workspace"], job["source"], commit)
+                    print(f"📦 Job {job['id']}: exported {rows} chunks to {path}")
+                except Exception as e:
+                    print(f"⚠️ Snapshot export failed for job {job['id']}: {e}")
+    except JobCancelled:
+        jobs.update_job(job["id"], status="cancelled", message="Cancelled")
+    except Exception as e:
+        print(f"⚠️ Job {job['id']} failed: {e}")
+        jobs.update_job(job["id"], status="failed", message=f"Error: {e}")
+
+
+def purge_workspaces():
+    """
+    Deletes workspaces of retired/cancelled/failed jobs and their rows in the index
+    (the live indexer would only remove rows it wrote itself, not snapshot imports).
+    """
+    for job in jobs.jobs_to_purge(config.JOB_RETENTION_HOURS):
+        if job.get("workspace"):
+            _remove_dir(jobs.workspace_dir(job))
+            jobs.delete_workspace_rows(job["workspace"])
+        if job["kind"] == "zip" and os.path.exists(job["source"]):
+            os.remove(job["source"])
+        jobs.update_job(job["id"], purged=True)
+
+
+def worker_loop(index):
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"👷 Worker {index} ({name}) waiting for jobs...")
+    last_purge = 0.0
+    while True:
+        try:
+            # One worker is enough for housekeeping
+            if index == 0 and time.time() - last_purge > 60:
+                jobs.recover_stale_jobs(config.JOB_STALE_SECONDS, config.JOB_MAX_ATTEMPTS)
+                purge_workspaces()
+                chat_store.purge_sessions(config.CHAT_RETENTION_DAYS)
+                last_purge = time.time()
+
+            job = jobs.claim_next_job(name)
+            if job is None:
+                time.sleep(config.JOB_POLL_SECONDS)
+                continue
+            print(f"⚙️  Worker {index} running job {job['id']} ({job['kind']})")
+            run_job(job)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            # Database hiccups shouldn't kill the worker
+            print(f"⚠️ Worker {index} error: {e}")
+            time.sleep(config.JOB_POLL_SECONDS * 5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clone-and-index job workers")
+    parser.add_argument("--workers", type=int, default=config.JOB_WORKERS)
+    args = parser.parse_args()
+
+    jobs.ensure_schema()
+    chat_store.ensure_schema()
+    os.makedirs(config.WATCH_DIR, exist_ok=True)
+    os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+
+    processes = [multiprocessing.Process(target=worker_loop, args=(i,), daemon=True) for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping workers...")